@@ -0,0 +1,60 @@
+"""
+HTML 正文提取基准：比较 lxml（去除样板内容）与 BeautifulSoup（全文）两种提取方式的吞吐量与输出大小
+
+用法：
+    python benchmarks/bench_html_extract.py
+    python benchmarks/bench_html_extract.py --rounds 50 --fixtures path/to/saved/pages
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fetch import bs4_html_to_text  # noqa: E402
+from html_extract import lxml_html_to_text  # noqa: E402
+
+EXTRACTORS = {
+    'bs4': bs4_html_to_text,
+    'lxml': lxml_html_to_text,
+}
+
+
+def bench(fn, data: bytes, rounds: int) -> float:
+    """返回单次提取的平均耗时（秒）"""
+    fn(data)  # warm up
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(data)
+    return (time.perf_counter() - start) / rounds
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the HTML text extractors on saved pages.")
+    parser.add_argument('--fixtures', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures'))
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.fixtures, '*.html')))
+    if not paths:
+        print(f"No *.html fixtures found in {args.fixtures}")
+        return
+    totals = {name: [0.0, 0, 0] for name in EXTRACTORS}  # 耗时、输入字节、输出字符
+    print(f"{'fixture':<24}{'KB':>8}{'extractor':>11}{'ms/doc':>10}{'MB/s':>8}{'out chars':>11}")
+    for path in paths:
+        data = open(path, 'rb').read()
+        for name, fn in EXTRACTORS.items():
+            seconds = bench(fn, data, args.rounds)
+            out_chars = len(fn(data))
+            totals[name][0] += seconds
+            totals[name][1] += len(data)
+            totals[name][2] += out_chars
+            print(f"{os.path.basename(path):<24}{len(data) / 1024:>8.1f}{name:>11}{seconds * 1000:>10.2f}"
+                  f"{len(data) / seconds / 1e6:>8.1f}{out_chars:>11}")
+    print()
+    for name, (seconds, size, out_chars) in totals.items():
+        print(f"{name:>5}: {len(paths) / seconds:.1f} docs/s, {size / seconds / 1e6:.1f} MB/s, {out_chars} output chars")
+
+
+if __name__ == "__main__":
+    main()
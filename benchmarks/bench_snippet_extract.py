@@ -0,0 +1,90 @@
+"""
+片段提取基准：比较逐句 F1 扫描（extract_snippet_with_context）与 BM25 段落检索（extract_passages_with_context）
+的耗时与命中率
+
+每个样例页面的全文重复拼接到 --chars 个字符（/search 中页面正文的上限），从正文中截取若干句子并随机删去部分词语
+作为搜索摘要；返回的上下文包含该句子即为命中。
+
+用法：
+    python benchmarks/bench_snippet_extract.py
+    python benchmarks/bench_snippet_extract.py --rounds 20 --chars 20000 --fixtures path/to/saved/pages
+"""
+import os
+import sys
+import glob
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fetch import bs4_html_to_text, extract_snippet_with_context, extract_passages_with_context  # noqa: E402
+from passages import segment_sentences  # noqa: E402
+
+EXTRACTORS = {
+    'f1-scan': extract_snippet_with_context,
+    'bm25': extract_passages_with_context,
+}
+
+
+def make_queries(text: str, count: int, rng: random.Random):
+    """从正文中抽取较长的句子，删去约三成词语后作为摘要；返回 (摘要, 原句)"""
+    sentences = [text[start:end] for start, end in segment_sentences(text) if end - start >= 60]
+    queries = []
+    for sentence in rng.sample(sentences, min(count, len(sentences))):
+        words = sentence.split()
+        if len(words) > 3:
+            words = [word for word in words if rng.random() > 0.3]
+            snippet = ' '.join(words)
+        else:
+            # 中文没有空格：截取句子中间的一段
+            start = rng.randrange(0, max(1, len(sentence) // 3))
+            snippet = sentence[start:start + max(20, len(sentence) // 2)]
+        queries.append((snippet, sentence))
+    return queries
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark snippet context extraction on saved pages.")
+    parser.add_argument('--fixtures', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures'))
+    parser.add_argument('--chars', type=int, default=50000, help='page text is repeated up to this many characters')
+    parser.add_argument('--queries', type=int, default=5, help='snippets per page')
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--context-chars', type=int, default=3000)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.fixtures, '*.html')))
+    if not paths:
+        print(f"No *.html fixtures found in {args.fixtures}")
+        return
+    rng = random.Random(0)
+    totals = {name: [0.0, 0, 0, 0] for name in EXTRACTORS}  # 耗时、调用次数、命中数、出错数
+    print(f"{'fixture':<24}{'chars':>8}{'extractor':>11}{'ms/call':>10}{'hits':>7}{'errors':>8}")
+    for path in paths:
+        text = bs4_html_to_text(open(path, 'rb').read(), max_chars=args.chars)
+        text = (text + ' ') * (args.chars // max(1, len(text)) + 1)
+        text = text[:args.chars]
+        queries = make_queries(text, args.queries, rng)
+        for name, fn in EXTRACTORS.items():
+            seconds, hits, errors = 0.0, 0, 0
+            for snippet, sentence in queries:
+                success, context = fn(text, snippet, args.context_chars)
+                hits += success and sentence in context
+                errors += context.startswith('Failed to extract')
+                start = time.perf_counter()
+                for _ in range(args.rounds):
+                    fn(text, snippet, args.context_chars)
+                seconds += (time.perf_counter() - start) / args.rounds
+            totals[name][0] += seconds
+            totals[name][1] += len(queries)
+            totals[name][2] += hits
+            totals[name][3] += errors
+            print(f"{os.path.basename(path):<24}{len(text):>8}{name:>11}{seconds / max(1, len(queries)) * 1000:>10.2f}"
+                  f"{hits:>4}/{len(queries):<2}{errors:>8}")
+    print()
+    for name, (seconds, calls, hits, errors) in totals.items():
+        print(f"{name:>8}: {seconds / max(1, calls) * 1000:.2f} ms/call, {hits}/{calls} hits, {errors} errors")
+    if totals['f1-scan'][3]:
+        print("f1-scan errors usually mean the NLTK punkt data used by sent_tokenize is not installed.")
+
+
+if __name__ == "__main__":
+    main()
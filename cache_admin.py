@@ -0,0 +1,94 @@
+"""
+缓存数据库维护命令行工具
+
+用法示例：
+    python cache_admin.py compress --codec zlib
+    python cache_admin.py maintain --crawler-max-mb 2048 --search-max-mb 256
+    python cache_admin.py vacuum --enable-incremental
+    python cache_admin.py fingerprint
+
+crawler_data.db 的全文索引触发器依赖 SQL 函数 decompress_text：本工具的所有连接都来自连接池，已注册该函数；
+自行编写的脚本请用 sqlite_pool.connect 打开数据库，sqlite3 命令行只能只读查询（写入 search_results 会报
+"no such function: decompress_text"）
+"""
+import argparse
+from crawler_database_manager import CrawlerDatabaseManager
+from search_database_manager import SearchDatabaseManager
+from cache_maintenance import CacheMaintainer
+from sqlite_pool import enable_incremental_vacuum
+
+
+def cmd_compress(args: argparse.Namespace) -> None:
+    """压缩已有的未压缩记录"""
+    crawler = CrawlerDatabaseManager(args.crawler_db, compression=args.codec)
+    search = SearchDatabaseManager(args.search_db, compression=args.codec)
+    print(f"{args.crawler_db}: compressed {crawler.compress_existing(args.batch_size)} rows")
+    print(f"{args.search_db}: compressed {search.compress_existing(args.batch_size)} rows")
+
+def cmd_maintain(args: argparse.Namespace) -> None:
+    """执行一轮维护：清理过期记录、按大小上限淘汰、增量回收空间"""
+    maintainer = CacheMaintainer(
+        CrawlerDatabaseManager(args.crawler_db),
+        SearchDatabaseManager(args.search_db, outdated_days=args.search_outdated_days, stale_days=args.search_stale_days),
+        crawler_max_age_days=args.crawler_max_age_days,
+        crawler_max_bytes=args.crawler_max_mb * 1024 * 1024 if args.crawler_max_mb else None,
+        search_max_bytes=args.search_max_mb * 1024 * 1024 if args.search_max_mb else None,
+        vacuum_pages=args.vacuum_pages,
+    )
+    for key, value in maintainer.run_once().items():
+        print(f"{key}: {value}")
+
+def cmd_vacuum(args: argparse.Namespace) -> None:
+    """增量回收空闲页；--enable-incremental 会对旧数据库执行一次完整 VACUUM 以开启增量模式"""
+    for manager in (CrawlerDatabaseManager(args.crawler_db), SearchDatabaseManager(args.search_db)):
+        if args.enable_incremental:
+            with manager._get_connection() as conn:
+                switched = enable_incremental_vacuum(conn)
+            if switched:
+                print(f"{manager.db_path}: switched to incremental auto_vacuum")
+                # 完整 VACUUM 可能重排 rowid，全文索引需要重建
+                if hasattr(manager, 'rebuild_index'):
+                    manager.rebuild_index()
+        print(f"{manager.db_path}: {manager.incremental_vacuum(args.pages)} free pages left")
+
+def cmd_fingerprint(args: argparse.Namespace) -> None:
+    """为旧记录计算内容指纹并标记近似重复页面"""
+    crawler = CrawlerDatabaseManager(args.crawler_db)
+    print(f"{args.crawler_db}: fingerprinted {crawler.backfill_fingerprints(args.batch_size)} rows")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Maintenance for the crawler and search cache databases.")
+    parser.add_argument('--crawler-db', default='crawler_data.db')
+    parser.add_argument('--search-db', default='search_data.db')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    compress = subparsers.add_parser('compress', help='compress existing uncompressed rows in place')
+    compress.add_argument('--codec', choices=['zlib', 'zstd'], default='zlib')
+    compress.add_argument('--batch-size', type=int, default=200)
+    compress.set_defaults(func=cmd_compress)
+
+    maintain = subparsers.add_parser('maintain', help='purge expired rows, enforce size caps and reclaim space')
+    maintain.add_argument('--crawler-max-age-days', type=float, default=None)
+    maintain.add_argument('--crawler-max-mb', type=int, default=None)
+    maintain.add_argument('--search-max-mb', type=int, default=None)
+    maintain.add_argument('--search-outdated-days', type=int, default=10)
+    maintain.add_argument('--search-stale-days', type=int, default=20)
+    maintain.add_argument('--vacuum-pages', type=int, default=256)
+    maintain.set_defaults(func=cmd_maintain)
+
+    vacuum = subparsers.add_parser('vacuum', help='return free pages to the file system')
+    vacuum.add_argument('--pages', type=int, default=1024)
+    vacuum.add_argument('--enable-incremental', action='store_true',
+                        help='convert databases created without incremental auto_vacuum (runs a full VACUUM once)')
+    vacuum.set_defaults(func=cmd_vacuum)
+
+    fingerprint = subparsers.add_parser('fingerprint', help='compute content fingerprints for rows stored before deduplication')
+    fingerprint.add_argument('--batch-size', type=int, default=200)
+    fingerprint.set_defaults(func=cmd_fingerprint)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
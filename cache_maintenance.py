@@ -0,0 +1,84 @@
+import threading
+from typing import Any, Dict, Optional
+from crawler_database_manager import CrawlerDatabaseManager
+from search_database_manager import SearchDatabaseManager
+
+
+class CacheMaintainer:
+    """
+    Periodic maintenance of the crawler and search caches.
+
+    Each run flushes buffered access times, purges expired rows and stale fetch-failure
+    records, trims each database to its size cap in LRU order and returns a bounded
+    number of free pages to the file system with ``incremental_vacuum``, so no single
+    step holds the write lock for long. Runs on a daemon thread (`start`) or once on demand (`run_once`).
+    """
+    def __init__(
+            self,
+            crawler_db_manager: CrawlerDatabaseManager,
+            search_db_manager: SearchDatabaseManager,
+            crawler_max_age_days: Optional[float]=None,
+            crawler_max_bytes: Optional[int]=None,
+            search_max_bytes: Optional[int]=None,
+            vacuum_pages: int=256,
+            interval_seconds: float=600
+        ):
+        """
+        Args:
+            crawler_db_manager (CrawlerDatabaseManager): The page cache.
+            search_db_manager (SearchDatabaseManager): The search cache; rows expire after its outdated_days + stale_days.
+            crawler_max_age_days (float): Page rows older than this are purged, None to keep them.
+            crawler_max_bytes (int): Size cap of the page cache, counted as the bytes stored in its rows
+                (indexes and the full-text index not included), None for no cap.
+            search_max_bytes (int): Size cap of the search cache, None for no cap.
+            vacuum_pages (int): Free pages returned per run and database.
+            interval_seconds (float): Delay between background runs.
+        """
+        self.crawler_db_manager = crawler_db_manager
+        self.search_db_manager = search_db_manager
+        self.crawler_max_age_days = crawler_max_age_days
+        self.crawler_max_bytes = crawler_max_bytes
+        self.search_max_bytes = search_max_bytes
+        self.vacuum_pages = vacuum_pages
+        self.interval_seconds = interval_seconds
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> Dict[str, Any]:
+        """执行一轮维护，返回各步骤的处理数量"""
+        crawler, search = self.crawler_db_manager, self.search_db_manager
+        report = {
+            'crawler_access_flushed': crawler.flush_access(),
+            'search_access_flushed': search.flush_access(),
+            'crawler_expired': crawler.purge_expired(self.crawler_max_age_days) if self.crawler_max_age_days else 0,
+            'search_expired': search.purge_expired(),
+            'crawler_failures_purged': crawler.purge_failures(),
+            'crawler_evicted': crawler.enforce_size_limit(self.crawler_max_bytes) if self.crawler_max_bytes else 0,
+            'search_evicted': search.enforce_size_limit(self.search_max_bytes) if self.search_max_bytes else 0,
+        }
+        report['crawler_free_pages'] = crawler.incremental_vacuum(self.vacuum_pages)
+        report['search_free_pages'] = search.incremental_vacuum(self.vacuum_pages)
+        return report
+
+    def _loop(self) -> None:
+        while not self._stop_event.wait(self.interval_seconds):
+            try:
+                report = self.run_once()
+                print(f"Cache maintenance: {report}")
+            except Exception as e:
+                print(f"Cache maintenance failed: {e}")
+
+    def start(self) -> None:
+        """启动后台维护线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name='cache-maintenance', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float]=None) -> None:
+        """停止后台维护线程"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
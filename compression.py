@@ -0,0 +1,48 @@
+import zlib
+from typing import Optional, Union
+
+try:
+    import zstandard
+except ImportError:  # zstd 为可选依赖，未安装时回退到 zlib
+    zstandard = None
+
+# 压缩后的值以 BLOB 存储，并带有版本标记；未压缩（旧数据或过短）的值保持 TEXT
+ZLIB_TAG = b'z1:'
+ZSTD_TAG = b'zs1:'
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+MIN_COMPRESS_SIZE = 256  # 短文本压缩收益不大，直接存储
+
+
+def compress_text(text: Optional[str], codec: Optional[str]='zlib') -> Optional[Union[str, bytes]]:
+    """
+    Compress text for storage.
+
+    Args:
+        text (str): The text to store; None is passed through.
+        codec (str): 'zlib', 'zstd' (falls back to zlib if `zstandard` is missing) or None for no compression.
+
+    Returns:
+        The tagged compressed bytes, or the text itself when it is short or compression is disabled.
+    """
+    if text is None or codec is None or len(text) < MIN_COMPRESS_SIZE:
+        return text
+    data = text.encode('utf-8')
+    if codec == 'zstd' and zstandard is not None:
+        return ZSTD_TAG + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return ZLIB_TAG + zlib.compress(data, ZLIB_LEVEL)
+
+def decompress_text(value: Optional[Union[str, bytes]]) -> Optional[str]:
+    """
+    Inverse of `compress_text`; plain TEXT values (legacy rows) are returned unchanged.
+    """
+    if not isinstance(value, (bytes, memoryview)):
+        return value
+    value = bytes(value)
+    if value.startswith(ZLIB_TAG):
+        return zlib.decompress(value[len(ZLIB_TAG):]).decode('utf-8')
+    if value.startswith(ZSTD_TAG):
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed cache entries")
+        return zstandard.ZstdDecompressor().decompress(value[len(ZSTD_TAG):]).decode('utf-8')
+    return value.decode('utf-8')
@@ -11,8 +11,24 @@ MODEL_INFOS = [
     { "model_name": "llama-3.3-70b-instruct", "isThink": False, "label": "海外开源", "order": 9 },
 ]
 FEACH_HTTP_TIMEOUT = 4
+PDF_HTTP_TIMEOUT = 15  # PDF 较大，下载时间上限单独设置
+READER_HTTP_TIMEOUT = 10  # 阅读服务（Jina reader）需要渲染页面，响应较慢
+JINA_READER_URL = 'https://r.jina.ai/'
+PDF_MAX_BYTES = 20 * 1024 * 1024  # 超过该大小的 PDF 不下载
+PDF_MAX_WORDS = 600  # PDF 只提取前 600 个词，达到后停止解析剩余页面
+HTML_MAX_BYTES = 2 * 1024 * 1024  # HTML 只下载前 2MB，超出部分直接截断
+HTML_EXTRACTOR = 'lxml'  # 正文提取：'lxml'（去除导航、页脚等样板内容）或 'bs4'（BeautifulSoup 全文）
+HTML_MAX_TEXT_CHARS = 50000  # 收集正文文本到该字符数即停止，解析仍覆盖已下载的全部 HTML（上限 HTML_MAX_BYTES）（与片段提取 extract_passages_with_context 的截断长度一致）
+PASSAGE_TOP_K = 3  # 每个页面按与摘要的匹配度最多保留 3 个互不重叠的段落
+PASSAGE_SEPARATOR = '\n...\n'
+SEARCH_HTTP_TIMEOUT = 8
 # SEARCH_API_URL = "https://api.tavily.com/search"
 SEARCH_API_URL = "https://api.bochaai.com/v1/web-search"
+SEARCH_BACKEND = 'bocha'  # 见 search_backends.SEARCH_BACKENDS
+# 对冲请求：主后端超过其延迟分位数仍未返回时，同时请求备用后端（None 表示关闭，需在 private_key 中配置 SEARCH_HEDGE_API_KEY）
+SEARCH_HEDGE_BACKEND = None
+SEARCH_HEDGE_API_URL = "https://api.tavily.com/search"
+SEARCH_HEDGE_PERCENTILE = 0.95
 # GPT_MODEL_API = 'https://dashscope.aliyuncs.com/compatible-mode/v1'  # Qwen API
 GPT_MODEL_API = 'https://cloud.infini-ai.com/maas/v1'
 GPT_MODEL_NAME = 'qwen2.5-72b-instruct'
\ No newline at end of file
@@ -0,0 +1,154 @@
+import re
+import math
+from functools import lru_cache
+from typing import Callable, List, Sequence, Tuple
+
+from const import PASSAGE_SEPARATOR
+from fetch import extract_passages_with_context
+from passages import rank_passages, segment_sentences
+from tokenizer import get_tokenizer, tokenizer_paths
+
+CHARS_PER_TOKEN = 4  # 估算：非 CJK 文本约 4 个字符 1 个 token，CJK 字符按每字 1 个 token
+PACK_RADIUS = 300  # 打包时每个段落在锚句两侧保留的字符数
+PACK_MAX_PASSAGES = 8
+
+_CJK = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]')
+
+
+def estimate_tokens(text: str) -> int:
+    """没有可用分词器时估算 token 数"""
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / CHARS_PER_TOKEN)
+
+@lru_cache(maxsize=None)
+def token_counter(model_name: str) -> Callable[[str], int]:
+    """
+    模型的 token 计数函数：使用模型的分词器（tokenizer.get_tokenizer，首次调用时加载）；
+    未配置分词器的模型、transformers 未安装或分词器文件缺失时使用估算
+    """
+    try:
+        tokenizer = get_tokenizer(model_name)
+    except Exception as e:
+        if model_name in tokenizer_paths:
+            print(f"Failed to load tokenizer of {model_name}, estimating token counts: {e}")
+        return estimate_tokens
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
+def fit_to_tokens(text: str, max_tokens: int, count_tokens: Callable[[str], int]) -> str:
+    """截取 text 开头不超过 max_tokens 个 token 的部分，在句子边界处截断"""
+    if max_tokens <= 0:
+        return ''
+    if count_tokens(text) <= max_tokens:
+        return text
+    end, used = 0, 0
+    for _, stop in segment_sentences(text):
+        tokens = count_tokens(text[end:stop])
+        if used + tokens > max_tokens:
+            break
+        used, end = used + tokens, stop
+    # 第一句就超出预算时按字符硬截断（每个 token 至少对应一个字符）
+    return text[:end] if end else text[:max_tokens]
+
+def pack_passages(text: str, query: str, max_tokens: int, count_tokens: Callable[[str], int]) -> str:
+    """
+    Select the parts of a document that fit in max_tokens tokens.
+
+    The whole text is kept if it fits. Otherwise the passages that best match the query
+    (see `passages.rank_passages`) are added in order of relevance while they fit, the
+    last one cut at a sentence boundary, and joined in document order by PASSAGE_SEPARATOR.
+    Without a matching passage the beginning of the text is kept.
+
+    Args:
+        text (str): The document text.
+        query (str): The question or snippet the passages should answer.
+        max_tokens (int): Token budget of the document.
+        count_tokens (Callable[[str], int]): Token counter, see `token_counter`.
+
+    Returns:
+        str: The packed text.
+    """
+    if max_tokens <= 0:
+        return ''
+    if count_tokens(text) <= max_tokens:
+        return text
+    passages = rank_passages(text, query, PACK_MAX_PASSAGES, PACK_RADIUS) if query else []
+    separator_tokens = count_tokens(PASSAGE_SEPARATOR)
+    selected, remaining = [], max_tokens
+    for start, end, _ in sorted(passages, key=lambda passage: passage[2], reverse=True):
+        budget = remaining - (separator_tokens if selected else 0)
+        piece = fit_to_tokens(text[start:end], budget, count_tokens)
+        if not piece:
+            break
+        selected.append((start, piece))
+        remaining = budget - count_tokens(piece)
+        if len(piece) < end - start:
+            break
+    if not selected:
+        return fit_to_tokens(text, max_tokens, count_tokens)
+    return PASSAGE_SEPARATOR.join(piece for _, piece in sorted(selected))
+
+def allocate_budget(needs: Sequence[int], weights: Sequence[float], budget: int) -> List[int]:
+    """
+    Split a token budget across documents in proportion to their weights, never giving a
+    document more than it needs; what a document does not need goes to the others.
+    """
+    allocation = [0] * len(needs)
+    active = [index for index, need in enumerate(needs) if need > 0]
+    remaining = budget
+    while active and remaining > 0:
+        total_weight = sum(weights[index] for index in active)
+        shares = {index: remaining * weights[index] / total_weight for index in active}
+        satisfied = [index for index in active if needs[index] <= shares[index]]
+        if not satisfied:
+            for index in active:
+                allocation[index] = int(shares[index])
+            break
+        for index in satisfied:
+            allocation[index] = needs[index]
+            remaining -= needs[index]
+        active = [index for index in active if index not in satisfied]
+    return allocation
+
+def document_weights(texts: Sequence[str], query: str) -> List[float]:
+    """文档权重：与查询最匹配段落的 BM25 分数归一化后映射到 [1, 2]，不匹配的文档权重为 1"""
+    best = [
+        max((score for _, _, score in rank_passages(text, query, top_k=1)), default=0.0) if query else 0.0
+        for text in texts
+    ]
+    top = max(best, default=0.0)
+    return [1 + score / top if top > 0 else 1.0 for score in best]
+
+def pack_documents(texts: Sequence[str], query: str, budget: int, count_tokens: Callable[[str], int]) -> List[str]:
+    """
+    Fit several documents into one token budget.
+
+    Documents that fit together are returned unchanged. Otherwise the budget is split by
+    relevance to the query (`document_weights`, `allocate_budget`) and each document is
+    reduced to its share with `pack_passages`.
+
+    Args:
+        texts (Sequence[str]): The document texts.
+        query (str): The question the documents should answer.
+        budget (int): Total token budget of the texts.
+        count_tokens (Callable[[str], int]): Token counter, see `token_counter`.
+
+    Returns:
+        List[str]: One packed text per document, in the input order.
+    """
+    needs = [count_tokens(text) for text in texts]
+    if sum(needs) <= budget:
+        return list(texts)
+    allocation = allocate_budget(needs, document_weights(texts, query), budget)
+    return [pack_passages(text, query, tokens, count_tokens) for text, tokens in zip(texts, allocation)]
+
+def extract_budgeted_context(full_text: str, snippet: str, context_chars: int, max_tokens: int,
+                             model_name: str) -> Tuple[bool, str]:
+    """
+    Extract the passages matching the snippet (see `fetch.extract_passages_with_context`),
+    or the beginning of the text when none match, and fit them into max_tokens tokens of
+    the model's tokenizer. Runs in the parse pool.
+    """
+    success, context = extract_passages_with_context(full_text, snippet, context_chars)
+    if not success:
+        context = full_text[:context_chars * 2]
+    return success, pack_passages(context, snippet, max_tokens, token_counter(model_name))
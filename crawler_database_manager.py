@@ -1,12 +1,101 @@
+import re
 import json
-from copy import deepcopy
+import threading
+from datetime import datetime, timedelta
 from contextlib import contextmanager
-from typing import Optional, Dict, Any, List, Generator
+from typing import Optional, Dict, Any, List, Generator, Tuple
 import sqlite3
+from sqlite_pool import get_pool, incremental_vacuum
+from memory_cache import LRUCache
+from compression import compress_text, decompress_text
+from fingerprint import simhash, fingerprint_bands, to_signed, to_unsigned, is_near_duplicate, canonicalize_url, NUM_BANDS
 
 class CrawlerDatabaseManager:
-    def __init__(self, db_path: str="crawler_data.db"):
+    # 可写入的字段；未提供的字段在插入时为 NULL，更新时保留原值
+    FIELDS = (
+        'url', 'keywords', 'title', 'site_name', 'site_icon', 'date', 'snippet', 'context',
+        'etag', 'last_modified', 'fetched_time'
+    )
+
+    # keywords 在 SQL 内通过 JSON1 取并集，无需先读取旧记录；
+    # 验证器（etag/last_modified）只在本次写入带有 fetched_time（即重新抓取过）时整体替换
+    UPSERT_SQL = '''
+        INSERT INTO search_results (
+            url, keywords, title, site_name, site_icon, date, snippet, context, created_time, last_access,
+            url_key, fingerprint, fp_band0, fp_band1, fp_band2, fp_band3, etag, last_modified, fetched_time
+        ) VALUES (
+            :url, :keywords, :title, :site_name, :site_icon, :date, :snippet, :context, :now, :now,
+            :url_key, :fingerprint, :fp_band0, :fp_band1, :fp_band2, :fp_band3, :etag, :last_modified, :fetched_time
+        )
+        ON CONFLICT(url) DO UPDATE SET
+            keywords = (
+                SELECT json_group_array(value) FROM (
+                    SELECT value FROM json_each(search_results.keywords)
+                    UNION
+                    SELECT value FROM json_each(excluded.keywords)
+                )
+            ),
+            title = COALESCE(excluded.title, title),
+            site_name = COALESCE(excluded.site_name, site_name),
+            site_icon = COALESCE(excluded.site_icon, site_icon),
+            date = COALESCE(excluded.date, date),
+            snippet = COALESCE(excluded.snippet, snippet),
+            context = COALESCE(excluded.context, context),
+            last_access = excluded.last_access,
+            fingerprint = COALESCE(excluded.fingerprint, fingerprint),
+            fp_band0 = COALESCE(excluded.fp_band0, fp_band0),
+            fp_band1 = COALESCE(excluded.fp_band1, fp_band1),
+            fp_band2 = COALESCE(excluded.fp_band2, fp_band2),
+            fp_band3 = COALESCE(excluded.fp_band3, fp_band3),
+            etag = CASE WHEN excluded.fetched_time IS NOT NULL THEN excluded.etag ELSE etag END,
+            last_modified = CASE WHEN excluded.fetched_time IS NOT NULL THEN excluded.last_modified ELSE last_modified END,
+            fetched_time = COALESCE(excluded.fetched_time, fetched_time)
+    '''
+
+    # 负缓存：抓取失败的 URL 在退避期内不再抓取。第 n 次连续失败后退避 基础时长 * 2^(n-1) 秒，
+    # 不超过 MAX_FAILURE_TTL；抓取成功后清除记录
+    FAILURE_TTL = {
+        'timeout': 10 * 60,
+        'connection': 30 * 60,
+        'http_5xx': 15 * 60,
+        'http_4xx': 24 * 3600,
+        'too_large': 7 * 24 * 3600,
+        'empty': 6 * 3600,
+        'error': 60 * 60,
+    }
+    MAX_FAILURE_TTL = 7 * 24 * 3600
+
+    # 全文索引只收录标题、摘要与正文的前 FTS_CONTEXT_CHARS 个字符：trigram 索引约为原文的数倍，全文收录会抵消正文压缩
+    FTS_CONTEXT_CHARS = 2000
+    FTS_CONTEXT_SQL = f"substr(decompress_text({{}}), 1, {FTS_CONTEXT_CHARS})"
+    # 一条记录存储的字节数（压缩后的正文按 BLOB 长度），用于大小上限；不含索引与全文索引
+    ROW_BYTES_SQL = ' + '.join(
+        f"COALESCE(length(CAST({column} AS BLOB)), 0)"
+        for column in ('url', 'keywords', 'title', 'site_name', 'site_icon', 'date', 'snippet', 'context')
+    )
+
+    def __init__(
+            self,
+            db_path: str="crawler_data.db",
+            memory_cache_bytes: int=0,
+            memory_ttl_seconds: Optional[float]=None,
+            compression: Optional[str]='zlib'
+        ):
+        """
+        Args:
+            db_path (str): SQLite 数据库路径
+            memory_cache_bytes (int): 内存 LRU 层的容量（字节），0 表示关闭
+            memory_ttl_seconds (float): 内存层记录的存活时间，None 表示不过期
+            compression (str): context 字段的压缩算法（'zlib'/'zstd'），None 表示不压缩
+        """
         self.db_path = db_path
+        self.compression = compression
+        self._pool = get_pool(db_path)
+        # 内存层：url -> 记录字典（keywords 已反序列化）
+        self._memory = LRUCache(memory_cache_bytes, memory_ttl_seconds) if memory_cache_bytes > 0 else None
+        # 读取时只在内存中记录访问时间，由 flush_access 批量写回 last_access
+        self._pending_access: Dict[str, str] = {}
+        self._access_lock = threading.Lock()
         self._init_db()
 
     def _init_db(self) -> None:
@@ -22,87 +111,681 @@ class CrawlerDatabaseManager:
                     date TEXT,
                     snippet TEXT,
                     context TEXT,
+                    created_time TIMESTAMP,
+                    last_access TIMESTAMP,
+                    url_key TEXT,
+                    fingerprint INTEGER,
+                    fp_band0 INTEGER,
+                    fp_band1 INTEGER,
+                    fp_band2 INTEGER,
+                    fp_band3 INTEGER,
+                    canonical_url TEXT,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_time TIMESTAMP,
                     CHECK (url LIKE 'http%')
                 )
             ''')
+            self._migrate_timestamps(conn)
+            self._migrate_fingerprints(conn)
+            self._migrate_validators(conn)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_search_results_last_access ON search_results (last_access)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_search_results_created ON search_results (created_time)")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS fetch_failures (
+                    url TEXT PRIMARY KEY NOT NULL,
+                    kind TEXT,
+                    failures INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    failed_time TIMESTAMP,
+                    retry_after TIMESTAMP
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_fetch_failures_retry ON fetch_failures (retry_after)")
+            self._init_fts(conn)
+            conn.commit()
+
+    def _init_fts(self, conn: sqlite3.Connection) -> None:
+        """
+        初始化 FTS5 全文索引 search_index（title/snippet/正文前 FTS_CONTEXT_CHARS 个字符，BM25 排序）
+
+        索引以解压视图 search_results_text 为外部内容表，由触发器与 search_results 保持同步；
+        中文没有空格分词，优先使用 trigram 分词器。视图与触发器调用 SQL 函数 decompress_text，
+        写入 search_results 的连接必须先注册该函数（连接池已注册，其他工具用 sqlite_pool.connect 打开）
+        """
+        context_sql = self.FTS_CONTEXT_SQL.format('context')
+        index = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'search_index'").fetchone()
+        view = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'view' AND name = 'search_results_text'").fetchone()
+        if index and ('detail=column' not in index[0] or not view or context_sql not in view[0]):
+            # 旧版本的索引收录完整正文并保存词项位置：删除后按当前的收录范围重建
+            conn.executescript('''
+                DROP TRIGGER IF EXISTS search_results_ai;
+                DROP TRIGGER IF EXISTS search_results_ad;
+                DROP TRIGGER IF EXISTS search_results_au;
+                DROP TABLE search_index;
+                DROP VIEW IF EXISTS search_results_text;
+            ''')
+            index = None
+        conn.execute(f'''
+            CREATE VIEW IF NOT EXISTS search_results_text AS
+            SELECT rowid, title, snippet, {context_sql} AS context FROM search_results
+        ''')
+        if not index:
+            # 查询只匹配单个词项（trigram 下为三元组），不需要短语查询，detail=column 不保存词项位置，索引更小
+            for tokenizer in ('trigram', 'unicode61'):
+                try:
+                    conn.execute(f'''
+                        CREATE VIRTUAL TABLE search_index USING fts5(
+                            title, snippet, context,
+                            content='search_results_text', content_rowid='rowid', tokenize='{tokenizer}', detail=column
+                        )
+                    ''')
+                    break
+                except sqlite3.OperationalError:
+                    continue
+            conn.execute("INSERT INTO search_index(search_index) VALUES ('rebuild')")
+        new_context, old_context = self.FTS_CONTEXT_SQL.format('new.context'), self.FTS_CONTEXT_SQL.format('old.context')
+        conn.executescript(f'''
+            CREATE TRIGGER IF NOT EXISTS search_results_ai AFTER INSERT ON search_results BEGIN
+                INSERT INTO search_index(rowid, title, snippet, context)
+                VALUES (new.rowid, new.title, new.snippet, {new_context});
+            END;
+            CREATE TRIGGER IF NOT EXISTS search_results_ad AFTER DELETE ON search_results BEGIN
+                INSERT INTO search_index(search_index, rowid, title, snippet, context)
+                VALUES ('delete', old.rowid, old.title, old.snippet, {old_context});
+            END;
+            CREATE TRIGGER IF NOT EXISTS search_results_au AFTER UPDATE OF title, snippet, context ON search_results
+            WHEN old.title IS NOT new.title OR old.snippet IS NOT new.snippet OR old.context IS NOT new.context
+            BEGIN
+                INSERT INTO search_index(search_index, rowid, title, snippet, context)
+                VALUES ('delete', old.rowid, old.title, old.snippet, {old_context});
+                INSERT INTO search_index(rowid, title, snippet, context)
+                VALUES (new.rowid, new.title, new.snippet, {new_context});
+            END;
+        ''')
+        sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'search_index'").fetchone()[0]
+        self._fts_trigram = 'trigram' in sql
+
+    def rebuild_index(self) -> None:
+        """重建全文索引（完整 VACUUM 可能改变 rowid，之后需要重建）"""
+        with self._get_connection() as conn:
+            conn.execute("INSERT INTO search_index(search_index) VALUES ('rebuild')")
+            conn.commit()
+
+    def _query_terms(self, words: List[str], max_terms: int=64) -> List[str]:
+        """
+        将查询词切分为索引可匹配的词项：trigram 分词器下为各词的字符三元组，
+        不足 3 个字符的词（如大部分中文词）无法由 trigram 索引匹配，不在其中
+        """
+        if not self._fts_trigram:
+            return words[:max_terms]
+        grams = [w[i:i + 3] for w in words if len(w) >= 3 for i in range(len(w) - 2)]
+        return list(dict.fromkeys(grams))[:max_terms]
+
+    def search_local(self, query: str, limit: int=10, min_coverage: float=0.0, candidates_per_hit: int=5) -> List[Dict[str, Any]]:
+        """
+        在本地已抓取的页面中检索（FTS5 + BM25），已标记为重复的页面不返回
+
+        索引匹配到的候选（至多 limit * candidates_per_hit 个）按查询词覆盖率、BM25 排序；查询词都短于 3 个字符
+        （trigram 索引无法匹配）时，在标题与摘要中按子串（instr）查找同时包含所有查询词的页面
+
+        Args:
+            query (str): 查询文本
+            limit (int): 最多返回的记录数
+            min_coverage (float): 查询词（含未进入索引查询的短词）在页面（标题、摘要、正文）中出现的最低比例，用于过滤弱匹配
+            candidates_per_hit (int): 每个返回记录对应的候选数
+
+        Returns:
+            list: 按覆盖率、BM25 排序的记录，附带 'score'（BM25，越小越相关；按子串查找时为 0）和 'coverage' 字段
+        """
+        words = list(dict.fromkeys(w for w in re.split(r'[\W_]+', query.casefold()) if w))
+        if not words:
+            return []
+        terms = self._query_terms(words)
+        try:
+            with self._get_connection() as conn:
+                if terms:
+                    match = ' OR '.join('"' + term.replace('"', '""') + '"' for term in terms)
+                    scored = conn.execute('''
+                        SELECT search_results.url AS url, bm25(search_index, 3.0, 2.0, 1.0) AS score
+                        FROM search_index JOIN search_results ON search_results.rowid = search_index.rowid
+                        WHERE search_index MATCH ? AND search_results.canonical_url IS NULL
+                        ORDER BY score
+                        LIMIT ?
+                    ''', (match, limit * candidates_per_hit)).fetchall()
+                else:
+                    # lower 只转换 ASCII 字母，短词多为中文，不受影响
+                    conditions = ' AND '.join(
+                        "instr(lower(COALESCE(title, '') || ' ' || COALESCE(snippet, '')), ?) > 0" for _ in words
+                    )
+                    scored = conn.execute(f'''
+                        SELECT url, 0.0 AS score FROM search_results
+                        WHERE canonical_url IS NULL AND {conditions}
+                        ORDER BY last_access DESC
+                        LIMIT ?
+                    ''', (*words, limit * candidates_per_hit)).fetchall()
+        except sqlite3.Error as e:
+            print(f"Local search failed: {e}")
+            return []
+        rows = self.get_many([row['url'] for row in scored])
+        hits = []
+        for row in scored:
+            item = rows.get(row['url'])
+            if not item:
+                continue
+            text = ' '.join(item.get(field) or '' for field in ('title', 'snippet', 'context')).casefold()
+            coverage = sum(word in text for word in words) / len(words)
+            if coverage >= min_coverage:
+                hits.append({**item, 'score': row['score'], 'coverage': coverage})
+        hits.sort(key=lambda hit: (-hit['coverage'], hit['score']))
+        return hits[:limit]
+
+    def _migrate_timestamps(self, conn: sqlite3.Connection) -> None:
+        """为旧表补充 created_time / last_access 列，旧记录以迁移时间回填"""
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(search_results)")}
+        for column in ("created_time", "last_access"):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE search_results ADD COLUMN {column} TIMESTAMP")
+        now = datetime.now().isoformat()
+        conn.execute("UPDATE search_results SET created_time = ? WHERE created_time IS NULL", (now,))
+        conn.execute("UPDATE search_results SET last_access = created_time WHERE last_access IS NULL")
+
+    def _migrate_fingerprints(self, conn: sqlite3.Connection) -> None:
+        """
+        为旧表补充指纹相关列并回填 url_key；旧记录的内容指纹可通过 backfill_fingerprints 计算
+        """
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(search_results)")}
+        for column, column_type in (
+            ("url_key", "TEXT"), ("fingerprint", "INTEGER"), ("fp_band0", "INTEGER"), ("fp_band1", "INTEGER"),
+            ("fp_band2", "INTEGER"), ("fp_band3", "INTEGER"), ("canonical_url", "TEXT"),
+        ):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE search_results ADD COLUMN {column} {column_type}")
+        urls = [row["url"] for row in conn.execute("SELECT url FROM search_results WHERE url_key IS NULL")]
+        conn.executemany(
+            "UPDATE search_results SET url_key = ? WHERE url = ?", [(canonicalize_url(url), url) for url in urls]
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_search_results_url_key ON search_results (url_key)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_search_results_canonical ON search_results (canonical_url)")
+        for i in range(NUM_BANDS):
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_search_results_fp_band{i} ON search_results (fp_band{i})")
+
+    def _migrate_validators(self, conn: sqlite3.Connection) -> None:
+        """为旧表补充 HTTP 验证器列；旧记录没有验证器，首次刷新时完整下载"""
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(search_results)")}
+        for column, column_type in (("etag", "TEXT"), ("last_modified", "TEXT"), ("fetched_time", "TIMESTAMP")):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE search_results ADD COLUMN {column} {column_type}")
 
     @contextmanager
     def _get_connection(self) -> Generator[sqlite3.Connection, None, None]:
-        """获取数据库连接（上下文管理器）"""
-        conn = sqlite3.connect(self.db_path)
-        try:
-            conn.row_factory = sqlite3.Row  # 使查询结果支持字典访问
+        """获取数据库连接（上下文管理器），复用连接池中当前线程的持久连接"""
+        with self._pool.connection() as conn:
             yield conn
-        finally:
-            conn.close()
 
-    def upsert(self, data: Dict[str, Any]) -> bool:
-        """插入或更新记录（原子化操作）"""
+    def _to_params(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """校验并转换为 SQL 参数；data 中带有 'fingerprint'（调用方已计算的内容指纹）时不再重新计算"""
         required_fields = {'url'}
         if not required_fields.issubset(data.keys()):
             raise ValueError(f"数据必须包含字段: {required_fields}")
+        params = {field: data.get(field) for field in self.FIELDS}
+        params['keywords'] = json.dumps(list(dict.fromkeys(data.get('keywords') or [])), ensure_ascii=False)
+        fingerprint = to_unsigned(data['fingerprint']) if 'fingerprint' in data else simhash(params['context'])
+        bands = fingerprint_bands(fingerprint) if fingerprint is not None else [None] * NUM_BANDS
+        params.update({f'fp_band{i}': band for i, band in enumerate(bands)})
+        params['fingerprint'] = to_signed(fingerprint)
+        params['url_key'] = canonicalize_url(params['url'])
+        params['context'] = compress_text(params['context'], self.compression)
+        params['now'] = datetime.now().isoformat()
+        return params
 
-        # 数据预处理
-        processed = deepcopy(data)
-        old_data = self.get(data['url'])
-        if old_data:
-            processed['keywords'] = list(set(old_data['keywords'] + data.get('keywords', [])))
-        processed['keywords'] = json.dumps(processed.get('keywords', []))
-
-        sql = '''
-            INSERT INTO search_results (
-                url, keywords, title, site_name, site_icon, date, snippet, context
-            ) VALUES (:url, :keywords, :title, :site_name, :site_icon, :date, :snippet, :context)
-            ON CONFLICT(url) DO UPDATE SET
-                keywords = excluded.keywords,
-                title = excluded.title,
-                site_name = excluded.site_name,
-                site_icon = excluded.site_icon,
-                date = excluded.date,
-                snippet = excluded.snippet,
-                context = excluded.context
-        '''
+    def upsert(self, data: Dict[str, Any]) -> bool:
+        """插入或更新记录（原子化操作），keywords 与旧记录合并"""
+        params = self._to_params(data)
         try:
             with self._get_connection() as conn:
-                conn.execute(sql, processed)
+                conn.execute(self.UPSERT_SQL, params)
+                self._mark_duplicates(conn, [params])
                 conn.commit()
                 return True
         except sqlite3.Error as e:
             print(f"数据库操作失败: {e}")
             return False
+        finally:
+            # keywords 在 SQL 内合并，内存层无法得知合并结果，直接失效，下次读取时从 SQLite 重新加载
+            self._forget([params['url']])
 
     def get(self, url: str) -> Optional[Dict[str, Any]]:
-        """根据 URL 获取记录"""
+        """根据 URL 获取记录（先查内存层）"""
+        self._touch([url])
+        if self._memory and (item := self._memory.get(url)):
+            return dict(item)
+        generation = self._memory.generation() if self._memory else None
         sql = "SELECT * FROM search_results WHERE url = ?"
         try:
             with self._get_connection() as conn:
                 cursor = conn.execute(sql, (url,))
                 row = cursor.fetchone()
                 if row:
-                    return self._row_to_dict(row)
+                    return dict(self._remember(self._row_to_dict(row), generation))
                 return None
         except sqlite3.Error as e:
             print(f"查询失败: {e}")
             return None
 
+    def get_many(self, urls: List[str], chunk_size: int=500) -> Dict[str, Dict[str, Any]]:
+        """根据多个 URL 批量获取记录（WHERE url IN (...)），返回 {url: 记录}，不存在的 URL 不在结果中"""
+        urls = list(dict.fromkeys(urls))
+        self._touch(urls)
+        results = {}
+        if self._memory:
+            for url in urls:
+                if item := self._memory.get(url):
+                    results[url] = dict(item)
+            urls = [url for url in urls if url not in results]
+        generation = self._memory.generation() if self._memory else None
+        try:
+            with self._get_connection() as conn:
+                for i in range(0, len(urls), chunk_size):
+                    chunk = urls[i:i + chunk_size]
+                    placeholders = ', '.join('?' * len(chunk))
+                    cursor = conn.execute(f"SELECT * FROM search_results WHERE url IN ({placeholders})", chunk)
+                    for row in cursor:
+                        results[row['url']] = dict(self._remember(self._row_to_dict(row), generation))
+        except sqlite3.Error as e:
+            print(f"查询失败: {e}")
+        return results
+
+    def _mark_duplicates(self, conn: sqlite3.Connection, params_list: List[Dict[str, Any]]) -> None:
+        """
+        在写入事务内标记重复页面：内容指纹近似（汉明距离小）或规范化 URL 相同的已有页面
+        作为 canonical_url，只与更早写入（created_time, rowid 更小）的页面比较，最早写入的页面为规范页面
+        """
+        for params in params_list:
+            canonical = None
+            fingerprint = to_unsigned(params['fingerprint'])
+            if fingerprint is not None:
+                bands = [params[f'fp_band{i}'] for i in range(NUM_BANDS)]
+                candidates = conn.execute('''
+                    SELECT url, fingerprint FROM search_results
+                    WHERE canonical_url IS NULL
+                      AND (created_time, rowid) < (SELECT created_time, rowid FROM search_results WHERE url = ?)
+                      AND (fp_band0 = ? OR fp_band1 = ? OR fp_band2 = ? OR fp_band3 = ?)
+                    ORDER BY created_time, rowid
+                    LIMIT 50
+                ''', (params['url'], *bands)).fetchall()
+                canonical = next(
+                    (row['url'] for row in candidates if is_near_duplicate(fingerprint, to_unsigned(row['fingerprint']))),
+                    None
+                )
+            if canonical is None:
+                row = conn.execute('''
+                    SELECT url FROM search_results
+                    WHERE url_key = ? AND canonical_url IS NULL
+                      AND (created_time, rowid) < (SELECT created_time, rowid FROM search_results WHERE url = ?)
+                    ORDER BY created_time, rowid
+                    LIMIT 1
+                ''', (params['url_key'], params['url'])).fetchone()
+                canonical = row['url'] if row else None
+            if canonical is not None:
+                # 规范页面本身不能再指向其他页面，避免形成链
+                conn.execute(
+                    "UPDATE search_results SET canonical_url = ? WHERE url = ? AND url NOT IN "
+                    "(SELECT canonical_url FROM search_results WHERE canonical_url IS NOT NULL)",
+                    (canonical, params['url'])
+                )
+
+    def resolve_duplicates(self, urls: List[str], chunk_size: int=500) -> Dict[str, str]:
+        """
+        查找 URL 的规范页面：已记录为重复的页面返回其 canonical_url；未缓存的 URL 若与已缓存页面
+        规范化后相同（如 http/https、www 变体），返回该页面。无重复的 URL 不在结果中
+        """
+        urls = list(dict.fromkeys(urls))
+        resolved = {}
+        try:
+            with self._get_connection() as conn:
+                for i in range(0, len(urls), chunk_size):
+                    chunk = urls[i:i + chunk_size]
+                    placeholders = ', '.join('?' * len(chunk))
+                    for row in conn.execute(f'''
+                        SELECT r.url AS url, c.url AS canonical FROM search_results r
+                        JOIN search_results c ON c.url = r.canonical_url
+                        WHERE r.url IN ({placeholders})
+                    ''', chunk):
+                        resolved[row['url']] = row['canonical']
+                    known = {row['url'] for row in conn.execute(
+                        f"SELECT url FROM search_results WHERE url IN ({placeholders})", chunk
+                    )}
+                    keys = {url: canonicalize_url(url) for url in chunk if url not in known}
+                    if not keys:
+                        continue
+                    key_placeholders = ', '.join('?' * len(keys))
+                    by_key = {}
+                    for row in conn.execute(f'''
+                        SELECT url_key, COALESCE(canonical_url, url) AS canonical FROM search_results
+                        WHERE url_key IN ({key_placeholders})
+                        ORDER BY created_time DESC
+                    ''', list(keys.values())):
+                        by_key[row['url_key']] = row['canonical']
+                    for url, key in keys.items():
+                        if key in by_key:
+                            resolved[url] = by_key[key]
+        except sqlite3.Error as e:
+            print(f"查询失败: {e}")
+        return resolved
+
+    def backfill_fingerprints(self, batch_size: int=200) -> int:
+        """迁移：为没有指纹的旧记录计算内容指纹并标记重复，返回处理的记录数"""
+        total = 0
+        last_rowid = 0
+        while True:
+            with self._get_connection() as conn:
+                rows = conn.execute('''
+                    SELECT rowid, url, context FROM search_results
+                    WHERE rowid > ? AND fingerprint IS NULL AND context IS NOT NULL
+                    ORDER BY rowid LIMIT ?
+                ''', (last_rowid, batch_size)).fetchall()
+                if not rows:
+                    return total
+                last_rowid = rows[-1]['rowid']
+                params_list = []
+                for row in rows:
+                    fingerprint = simhash(decompress_text(row['context']))
+                    if fingerprint is None:
+                        continue
+                    params = {f'fp_band{i}': band for i, band in enumerate(fingerprint_bands(fingerprint))}
+                    params.update(url=row['url'], fingerprint=to_signed(fingerprint), url_key=canonicalize_url(row['url']))
+                    params_list.append(params)
+                conn.executemany('''
+                    UPDATE search_results SET fingerprint = :fingerprint,
+                        fp_band0 = :fp_band0, fp_band1 = :fp_band1, fp_band2 = :fp_band2, fp_band3 = :fp_band3
+                    WHERE url = :url
+                ''', params_list)
+                self._mark_duplicates(conn, params_list)
+                conn.commit()
+                total += len(params_list)
+
+    @staticmethod
+    def needs_revalidation(item: Dict[str, Any], max_age_seconds: float) -> bool:
+        """记录自上次抓取（旧记录按 created_time）起是否已超过 max_age_seconds，需要条件请求刷新"""
+        fetched_time = item.get('fetched_time') or item.get('created_time')
+        if not fetched_time:
+            return True
+        return datetime.now() - datetime.fromisoformat(fetched_time) > timedelta(seconds=max_age_seconds)
+
+    def mark_revalidated(self, validators: List[Dict[str, Any]]) -> int:
+        """
+        记录条件请求返回 304 的页面：更新 fetched_time，响应带有新验证器时一并更新，内容保持不变
+
+        Args:
+            validators (list): [{'url', 'fetched_time', 'etag', 'last_modified'}]
+
+        Returns:
+            int: 更新的记录数
+        """
+        if not validators:
+            return 0
+        params = [
+            {'url': v['url'], 'fetched_time': v['fetched_time'], 'etag': v.get('etag'), 'last_modified': v.get('last_modified')}
+            for v in validators
+        ]
+        try:
+            with self._get_connection() as conn:
+                conn.executemany('''
+                    UPDATE search_results SET fetched_time = :fetched_time,
+                        etag = COALESCE(:etag, etag), last_modified = COALESCE(:last_modified, last_modified)
+                    WHERE url = :url
+                ''', params)
+                conn.commit()
+                return len(params)
+        except sqlite3.Error as e:
+            print(f"数据库操作失败: {e}")
+            return 0
+        finally:
+            self._forget([param['url'] for param in params])
+
+    def failure_states(self, urls: List[str], chunk_size: int=500) -> Dict[str, bool]:
+        """
+        负缓存：返回有失败记录的 URL 及其是否仍在退避期内（retry_after 晚于当前时间）；
+        没有失败记录的 URL 不在结果中，抓取成功后无需 clear_failures
+        """
+        urls = list(dict.fromkeys(urls))
+        now = datetime.now().isoformat()
+        states = {}
+        try:
+            with self._get_connection() as conn:
+                for i in range(0, len(urls), chunk_size):
+                    chunk = urls[i:i + chunk_size]
+                    placeholders = ', '.join('?' * len(chunk))
+                    states.update((row['url'], row['retry_after'] > now) for row in conn.execute(
+                        f"SELECT url, retry_after FROM fetch_failures WHERE url IN ({placeholders})", chunk
+                    ))
+        except sqlite3.Error as e:
+            print(f"查询失败: {e}")
+        return states
+
+    def record_failures(self, failures: List[Dict[str, Any]], chunk_size: int=500) -> int:
+        """
+        记录抓取失败，连续失败次数越多退避越久
+
+        Args:
+            failures (list): [{'url', 'kind', 'error'}]，kind 见 FAILURE_TTL
+
+        Returns:
+            int: 记录的条数
+        """
+        if not failures:
+            return 0
+        now = datetime.now()
+        failures = list({failure['url']: failure for failure in failures}.values())
+        try:
+            with self._get_connection() as conn:
+                counts = {}
+                for i in range(0, len(failures), chunk_size):
+                    chunk = [failure['url'] for failure in failures[i:i + chunk_size]]
+                    placeholders = ', '.join('?' * len(chunk))
+                    counts.update((row['url'], row['failures']) for row in conn.execute(
+                        f"SELECT url, failures FROM fetch_failures WHERE url IN ({placeholders})", chunk
+                    ))
+                params = []
+                for failure in failures:
+                    count = counts.get(failure['url'], 0) + 1
+                    base_ttl = self.FAILURE_TTL.get(failure['kind'], self.FAILURE_TTL['error'])
+                    ttl = min(base_ttl * 2 ** min(count - 1, 32), self.MAX_FAILURE_TTL)
+                    params.append((
+                        failure['url'], failure['kind'], count, (failure.get('error') or '')[:500],
+                        now.isoformat(), (now + timedelta(seconds=ttl)).isoformat()
+                    ))
+                conn.executemany('''
+                    INSERT OR REPLACE INTO fetch_failures (url, kind, failures, error, failed_time, retry_after)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', params)
+                conn.commit()
+                return len(params)
+        except sqlite3.Error as e:
+            print(f"数据库操作失败: {e}")
+            return 0
+
+    def clear_failures(self, urls: List[str], chunk_size: int=500) -> int:
+        """抓取成功后清除 URL 的失败记录，返回清除条数"""
+        urls = list(dict.fromkeys(urls))
+        cleared = 0
+        try:
+            with self._get_connection() as conn:
+                for i in range(0, len(urls), chunk_size):
+                    chunk = urls[i:i + chunk_size]
+                    placeholders = ', '.join('?' * len(chunk))
+                    cleared += conn.execute(f"DELETE FROM fetch_failures WHERE url IN ({placeholders})", chunk).rowcount
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"数据库操作失败: {e}")
+        return cleared
+
+    def purge_failures(self) -> int:
+        """删除退避期结束已超过 MAX_FAILURE_TTL 的失败记录（此后重新从第一次失败计算退避），返回删除条数"""
+        cutoff = (datetime.now() - timedelta(seconds=self.MAX_FAILURE_TTL)).isoformat()
+        try:
+            with self._get_connection() as conn:
+                deleted = conn.execute("DELETE FROM fetch_failures WHERE retry_after < ?", (cutoff,)).rowcount
+                conn.commit()
+                return deleted
+        except sqlite3.Error as e:
+            print(f"Delete failed: {e}")
+            return 0
+
+    def _touch(self, urls: List[str]) -> None:
+        """记录访问时间（不存在的 URL 在写回时不会产生影响）"""
+        now = datetime.now().isoformat()
+        with self._access_lock:
+            for url in urls:
+                self._pending_access[url] = now
+
+    def flush_access(self) -> int:
+        """将缓冲的访问时间批量写回 last_access，返回写回条数"""
+        with self._access_lock:
+            pending, self._pending_access = self._pending_access, {}
+        if not pending:
+            return 0
+        try:
+            with self._get_connection() as conn:
+                conn.executemany(
+                    "UPDATE search_results SET last_access = ? WHERE url = ? AND last_access < ?",
+                    [(ts, url, ts) for url, ts in pending.items()]
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Flush access time failed: {e}")
+            return 0
+        return len(pending)
+
+    def purge_expired(self, max_age_days: float) -> int:
+        """删除 created_time 早于 max_age_days 天前的记录，返回删除条数"""
+        cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+        deleted, _ = self._delete_where("created_time < ?", (cutoff,))
+        if deleted:
+            self.optimize_index()
+        return deleted
+
+    def stored_size(self) -> int:
+        """所有记录存储的字节数（见 ROW_BYTES_SQL）"""
+        with self._get_connection() as conn:
+            return conn.execute(f"SELECT COALESCE(SUM({self.ROW_BYTES_SQL}), 0) FROM search_results").fetchone()[0]
+
+    def enforce_size_limit(self, max_bytes: int, batch_size: int=200) -> int:
+        """
+        按 LRU（last_access 最早优先）删除记录，直到记录存储的字节数（stored_size）不超过 max_bytes，返回删除条数
+
+        上限按记录本身计算而不是按文件页数：全文索引的删除先写入删除标记，删除记录后文件占用反而增长，
+        按页数计算会一直删到表空为止。删除后合并索引段，清除删除标记
+        """
+        self.flush_access()
+        size = self.stored_size()
+        deleted = 0
+        while size > max_bytes:
+            removed, removed_bytes = self._delete_where(
+                "url IN (SELECT url FROM search_results ORDER BY last_access LIMIT ?)", (batch_size,)
+            )
+            if removed == 0:
+                break
+            deleted += removed
+            size -= removed_bytes
+        if deleted:
+            self.optimize_index()
+        return deleted
+
+    def optimize_index(self) -> None:
+        """合并全文索引的所有段，清除删除记录留下的删除标记（释放的页由 incremental_vacuum 归还）"""
+        try:
+            with self._get_connection() as conn:
+                conn.execute("INSERT INTO search_index(search_index) VALUES ('optimize')")
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Optimize index failed: {e}")
+
+    def incremental_vacuum(self, pages: int=256) -> int:
+        """小步归还空闲页，返回剩余空闲页数"""
+        with self._get_connection() as conn:
+            return incremental_vacuum(conn, pages)
+
+    def _delete_where(self, condition: str, params: tuple) -> Tuple[int, int]:
+        """按条件删除记录并使内存层失效，返回（删除条数，删除记录存储的字节数）"""
+        try:
+            with self._get_connection() as conn:
+                rows = conn.execute(
+                    f"DELETE FROM search_results WHERE {condition} RETURNING url, {self.ROW_BYTES_SQL} AS size", params
+                ).fetchall()
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Delete failed: {e}")
+            return 0, 0
+        self._forget([row['url'] for row in rows])
+        return len(rows), sum(row['size'] for row in rows)
+
+    def _remember(self, item: Dict[str, Any], generation: Optional[int]) -> Dict[str, Any]:
+        """
+        将从 SQLite 读取的记录回填到内存层，按文本字段长度计算大小；
+        generation 为读取前的内存层失效代数，读取期间该记录被写入或删除时不回填
+        """
+        if self._memory:
+            size = sum(len(v) for v in item.values() if isinstance(v, str)) + sum(len(k) for k in item['keywords'])
+            self._memory.put(item['url'], item, size, generation=generation)
+        return item
+
+    def _forget(self, urls: List[str]) -> None:
+        """使内存层中的记录失效"""
+        if self._memory:
+            for url in urls:
+                self._memory.invalidate(url)
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """内存层的命中统计，未开启内存层时返回 None"""
+        return self._memory.stats() if self._memory else None
+
     def _row_to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
         """将查询结果转换为字典并反序列化特殊字段"""
         data = dict(row)
         data['keywords'] = json.loads(data['keywords']) if data['keywords'] else []
+        data['context'] = decompress_text(data['context'])
         return data
 
+    def compress_existing(self, batch_size: int=200) -> int:
+        """迁移：分批压缩尚未压缩的 context，返回处理的记录数"""
+        if self.compression is None:
+            return 0
+        total = 0
+        last_rowid = 0
+        while True:
+            with self._get_connection() as conn:
+                rows = conn.execute('''
+                    SELECT rowid, context FROM search_results
+                    WHERE rowid > ? AND typeof(context) = 'text'
+                    ORDER BY rowid LIMIT ?
+                ''', (last_rowid, batch_size)).fetchall()
+                if not rows:
+                    return total
+                last_rowid = rows[-1]['rowid']
+                updates = [
+                    (compressed, row['rowid']) for row in rows
+                    if (compressed := compress_text(row['context'], self.compression)) is not row['context']
+                ]
+                conn.executemany("UPDATE search_results SET context = ? WHERE rowid = ?", updates)
+                conn.commit()
+                total += len(updates)
+
     def batch_upsert(self, data_list: List[Dict[str, Any]]) -> int:
-        """批量插入/更新（事务操作）"""
-        success_count = 0
+        """批量插入/更新（单连接、单事务、executemany）"""
+        self.flush_access()
+        if not data_list:
+            return 0
+        params = [self._to_params(data) for data in data_list]
         try:
             with self._get_connection() as conn:
-                conn.execute("BEGIN TRANSACTION")
-                for data in data_list:
-                    if self.upsert(data):
-                        success_count += 1
+                conn.executemany(self.UPSERT_SQL, params)
+                self._mark_duplicates(conn, params)
                 conn.commit()
-                return success_count
+                return len(params)
         except sqlite3.Error as e:
             print(f"Batch upsert failed: {e}")
-            conn.rollback()
-            return 0
\ No newline at end of file
+            return 0
+        finally:
+            self._forget([param['url'] for param in params])
@@ -0,0 +1,196 @@
+from typing import Any, Callable, Dict, Optional, Type
+from urllib.parse import urlsplit
+import httpx
+
+from const import FEACH_HTTP_TIMEOUT, PDF_HTTP_TIMEOUT, READER_HTTP_TIMEOUT, JINA_READER_URL, PDF_MAX_BYTES, HTML_MAX_BYTES
+from fetch import headers, conditional_headers, response_charset, ResponseTooLarge
+
+# 已注册的正文提取后端：name -> ExtractBackend 子类
+EXTRACT_BACKENDS: Dict[str, Type['ExtractBackend']] = {}
+
+
+def register_extractor(name: str) -> Callable[[Type['ExtractBackend']], Type['ExtractBackend']]:
+    """注册正文提取后端的类装饰器"""
+    def decorator(cls: Type['ExtractBackend']) -> Type['ExtractBackend']:
+        cls.name = name
+        EXTRACT_BACKENDS[name] = cls
+        return cls
+    return decorator
+
+def create_extractor(name: str, **kwargs) -> 'ExtractBackend':
+    """根据注册名创建正文提取后端实例"""
+    if name not in EXTRACT_BACKENDS:
+        raise ValueError(f"Extract backend {name} not found in EXTRACT_BACKENDS")
+    return EXTRACT_BACKENDS[name](**kwargs)
+
+def make_download(
+        kind: str='html',
+        body: bytes=b'',
+        encoding: Optional[str]=None,
+        etag: Optional[str]=None,
+        last_modified: Optional[str]=None,
+        not_modified: bool=False
+    ) -> Dict[str, Any]:
+    """构造统一格式的下载结果；kind 决定解析方式：'html'、'pdf' 或 'reader'（阅读服务返回的 markdown）"""
+    return {
+        'kind': kind,
+        'body': body,
+        'encoding': encoding,
+        'etag': etag,
+        'last_modified': last_modified,
+        'not_modified': not_modified,
+    }
+
+async def aread_limited(response: httpx.Response, max_bytes: int, truncate: bool=False) -> bytes:
+    """
+    Read a streamed response body, stopping as soon as it exceeds max_bytes.
+
+    Args:
+        response (httpx.Response): A response opened with ``client.stream``.
+        max_bytes (int): Maximum number of body bytes to read.
+        truncate (bool): Return the first max_bytes bytes instead of raising (for formats that
+            can be parsed partially, such as HTML).
+
+    Raises:
+        ResponseTooLarge: If truncate is False and Content-Length or the bytes received exceed max_bytes.
+    """
+    content_length = response.headers.get('Content-Length', '')
+    if not truncate and content_length.isdigit() and int(content_length) > max_bytes:
+        raise ResponseTooLarge(f"Content-Length {content_length} exceeds {max_bytes} bytes")
+    chunks, size = [], 0
+    async for chunk in response.aiter_bytes():
+        size += len(chunk)
+        if size > max_bytes:
+            if truncate:
+                chunks.append(chunk[:len(chunk) - (size - max_bytes)])
+                break
+            raise ResponseTooLarge(f"Response body exceeds {max_bytes} bytes")
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+
+class ExtractBackend:
+    """
+    Base class of a page extraction backend.
+
+    A backend downloads a URL into a `make_download` result (the body is parsed afterwards
+    according to its kind) through its own pooled ``httpx.AsyncClient``. ``timeout`` bounds
+    the whole download, so a slow backend fails and the next one in the chain is tried.
+    Backends with the same ``transport`` request the same address (e.g. pdf and html both
+    download the page directly), so after one of them fails the others are skipped.
+    Subclasses implement `download` and are registered with `register_extractor`.
+    """
+    name: str = ''
+    transport: str = 'direct'
+    default_timeout: float = FEACH_HTTP_TIMEOUT
+
+    def __init__(
+            self,
+            api_key: str='',
+            endpoint: str='',
+            timeout: Optional[float]=None,
+            max_connections: int=32,
+            max_keepalive_connections: int=32,
+            max_html_bytes: int=HTML_MAX_BYTES,
+            max_pdf_bytes: int=PDF_MAX_BYTES
+        ):
+        """
+        Args:
+            api_key (str): API key of the service, if any.
+            endpoint (str): Base URL of the service, if any.
+            timeout (float): Time limit of one download in seconds, defaults to `default_timeout`.
+            max_connections (int): Maximum number of open connections.
+            max_keepalive_connections (int): Idle connections kept open for reuse.
+            max_html_bytes (int): HTML bodies are truncated after this many bytes.
+            max_pdf_bytes (int): Larger PDFs are rejected while streaming.
+        """
+        self.api_key = api_key
+        self.endpoint = endpoint
+        self.timeout = timeout if timeout is not None else self.default_timeout
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.max_html_bytes = max_html_bytes
+        self.max_pdf_bytes = max_pdf_bytes
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """获取该后端的异步 HTTP 客户端（惰性创建，连接在请求间复用）"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers=headers,
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                ),
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """关闭 HTTP 客户端（应用关闭时调用）"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    def accepts(self, url: str) -> bool:
+        """该后端是否处理此 URL"""
+        return True
+
+    def request_url(self, url: str) -> str:
+        """实际请求的 URL（用于按主机限制并发）"""
+        return url
+
+    async def download(self, url: str, validators: Optional[Dict[str, Any]]=None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+@register_extractor('html')
+class HtmlBackend(ExtractBackend):
+    """Direct download; a response that turns out to be a PDF is read with the PDF size limit."""
+    async def download(self, url: str, validators: Optional[Dict[str, Any]]=None) -> Dict[str, Any]:
+        # 先检查响应头再读取响应体，PDF 只下载一次且受大小上限约束
+        async with self._get_client().stream('GET', url, headers=conditional_headers(validators)) as response:
+            etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+            if response.status_code == 304:
+                # The cached copy is still current: skip download and parsing
+                return make_download(etag=etag, last_modified=last_modified, not_modified=True)
+            response.raise_for_status()
+            content_type = response.headers.get('Content-Type', '')
+            encoding = response_charset(content_type)
+            if 'pdf' in content_type:
+                return make_download('pdf', await aread_limited(response, self.max_pdf_bytes), encoding, etag, last_modified)
+            # 超过上限的页面截断后解析，不再读取剩余部分
+            body = await aread_limited(response, self.max_html_bytes, truncate=True)
+            return make_download('html', body, encoding, etag, last_modified)
+
+
+@register_extractor('pdf')
+class PdfBackend(HtmlBackend):
+    """Direct download of .pdf URLs, with a longer time limit than HTML pages."""
+    default_timeout = PDF_HTTP_TIMEOUT
+
+    def accepts(self, url: str) -> bool:
+        return urlsplit(url).path.lower().endswith('.pdf')
+
+
+@register_extractor('reader')
+class ReaderBackend(ExtractBackend):
+    """Reader service (Jina reader API): GET ``{endpoint}{url}`` returns the page as markdown."""
+    default_timeout = READER_HTTP_TIMEOUT
+    transport = 'reader'
+
+    def __init__(self, api_key: str='', endpoint: str=JINA_READER_URL, **kwargs):
+        super().__init__(api_key=api_key, endpoint=endpoint or JINA_READER_URL, **kwargs)
+
+    def request_url(self, url: str) -> str:
+        return f'{self.endpoint}{url}'
+
+    async def download(self, url: str, validators: Optional[Dict[str, Any]]=None) -> Dict[str, Any]:
+        request_headers = {'X-Return-Format': 'markdown'}
+        if self.api_key:
+            request_headers['Authorization'] = f'Bearer {self.api_key}'
+        async with self._get_client().stream('GET', self.request_url(url), headers=request_headers) as response:
+            response.raise_for_status()
+            body = await aread_limited(response, self.max_html_bytes, truncate=True)
+            return make_download('reader', body, response.charset_encoding)
@@ -1,10 +1,9 @@
 import re
-import time
 import string
-import requests
+import asyncio
 from io import BytesIO
-from typing import Optional, Tuple
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import aclosing
+from typing import Any, Dict, Optional, Tuple, Union
 import pdfplumber
 from bs4 import BeautifulSoup
 from tqdm import tqdm
@@ -15,8 +14,11 @@ nltk.data.path.append(nltk_path)
 # nltk.download('punkt', download_dir=nltk_path)
 from nltk.tokenize import sent_tokenize
 
-from const import EXTRACT_ERROR_MAKER, FEACH_HTTP_TIMEOUT
+from const import EXTRACT_ERROR_MAKER, JINA_READER_URL, PDF_MAX_WORDS, HTML_MAX_TEXT_CHARS, HTML_EXTRACTOR, PASSAGE_TOP_K, \
+                  PASSAGE_SEPARATOR
 from utils import detect_language_ratio
+from html_extract import lxml_html_to_text
+from passages import rank_passages
 
 headers = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
@@ -28,8 +30,6 @@ headers = {
     'Connection': 'keep-alive',
     'Upgrade-Insecure-Requests': '1'
 }
-session = requests.Session()
-session.headers.update(headers)
 
 
 def remove_punctuation(text: str) -> str:
@@ -74,6 +74,8 @@ def extract_snippet_with_context(full_text: str, snippet: str, context_chars: in
     """
     Extract the sentence that best matches the snippet and its context from the full text.
 
+    Superseded by `extract_passages_with_context`; kept as the baseline of benchmarks/bench_snippet_extract.py.
+
     Args:
         full_text (str): The full text extracted from the webpage.
         snippet (str): The snippet to match.
@@ -130,38 +132,258 @@ def extract_snippet_with_context(full_text: str, snippet: str, context_chars: in
     except Exception as e:
         return False, f"Failed to extract snippet context due to {str(e)}"
 
-def extract_pdf_text(url):
+def extract_passages_with_context(full_text: str, snippet: str, context_chars: int = 2500,
+                                  top_k: int = PASSAGE_TOP_K) -> Tuple[bool, str]:
     """
-    Extract text from a PDF.
+    Extract the passages that best match the snippet, with their context, from the full text.
+
+    Sentences are segmented once with their offsets and scored with BM25 against the snippet;
+    the top_k best non-overlapping passages are kept (see `passages.rank_passages`). Replaces
+    the sentence-by-sentence F1 scan of `extract_snippet_with_context`.
 
     Args:
-        url (str): URL of the PDF file.
+        full_text (str): The full text extracted from the webpage.
+        snippet (str): The snippet to match.
+        context_chars (int): Characters of context per side, shared among the passages.
+        top_k (int): Maximum number of passages.
 
     Returns:
-        str: Extracted text content or error message.
+        Tuple[bool, str]: The first element indicates whether extraction was successful, the second element is
+        the passages in document order joined by PASSAGE_SEPARATOR.
     """
     try:
-        response = session.get(url, timeout=FEACH_HTTP_TIMEOUT)  # Set timeout to 20 seconds
-        if response.status_code != 200:
-            return f"{EXTRACT_ERROR_MAKER}Error: Unable to retrieve the PDF (status code {response.status_code})"
-        
+        full_text = full_text[:HTML_MAX_TEXT_CHARS]
+        passages = rank_passages(full_text, snippet, top_k, radius=context_chars // top_k)
+        if passages:
+            return True, PASSAGE_SEPARATOR.join(full_text[start:end] for start, end, _ in passages)
+        # If no matching sentence is found, return the first context_chars*2 characters of the full text
+        return False, full_text[:context_chars * 2]
+    except Exception as e:
+        return False, f"Failed to extract snippet context due to {str(e)}"
+
+class ResponseTooLarge(Exception):
+    """The response body exceeds the configured size limit."""
+
+def response_charset(content_type: str) -> Optional[str]:
+    """The charset declared in a Content-Type header, if any."""
+    match = re.search(r'charset=["\']?([\w.:-]+)', content_type, re.IGNORECASE)
+    return match.group(1) if match else None
+
+def pdf_bytes_to_text(data: bytes, max_words: int = PDF_MAX_WORDS) -> str:
+    """
+    Extract text from downloaded PDF bytes.
+
+    Args:
+        data (bytes): The PDF file content.
+        max_words (int): Word budget; remaining pages are not parsed once it is reached.
+
+    Returns:
+        str: The first max_words words or error message.
+    """
+    try:
+        words = []
         # Open the PDF file using pdfplumber
-        with pdfplumber.open(BytesIO(response.content)) as pdf:
-            full_text = ""
+        with pdfplumber.open(BytesIO(data)) as pdf:
             for page in pdf.pages:
                 text = page.extract_text()
+                page.close()  # Release the page's parsed objects
                 if text:
-                    full_text += text
-        
+                    words.extend(text.split())
+                if len(words) >= max_words:
+                    break
         # Limit the text length
-        cleaned_text = ' '.join(full_text.split()[:600])
-        return cleaned_text
-    except requests.exceptions.Timeout:
-        return f"{EXTRACT_ERROR_MAKER}Error: Request timed out after 20 seconds"
+        return ' '.join(words[:max_words])
     except Exception as e:
         return f"{EXTRACT_ERROR_MAKER}Error: {str(e)}"
 
-def extract_text_from_url(url, use_jina=False, jina_api_key=None, snippet: Optional[str] = None):
+def extract_pdf_text(url):
+    """
+    Extract text from a PDF.
+
+    Args:
+        url (str): URL of the PDF file.
+
+    Returns:
+        str: Extracted text content or error message.
+    """
+    return fetch_url(url)['text']
+
+def clean_reader_text(markdown: str) -> str:
+    """Strip link targets and markdown rules from Jina reader output."""
+    # Remove URLs
+    pattern = r"\(https?:.*?\)|\[https?:.*?\]"
+    return re.sub(pattern, "", markdown).replace('---','-').replace('===','=').replace('   ',' ').replace('   ',' ')
+
+def bs4_html_to_text(html: Union[str, bytes], encoding: Optional[str] = None, max_chars: int = HTML_MAX_TEXT_CHARS) -> str:
+    """
+    Extract all visible text of an HTML document with BeautifulSoup.
+
+    The whole document is parsed into a tree first (its size is bounded by the HTML_MAX_BYTES
+    download cut, not by max_chars); only the collection of text stops early.
+
+    Args:
+        html (str | bytes): The document; bytes are decoded using `encoding` or the document's own declaration.
+        encoding (Optional[str]): Charset from the Content-Type header.
+        max_chars (int): Stop collecting text once this many characters have been gathered.
+
+    Returns:
+        str: The text, at most max_chars characters.
+    """
+    kwargs = {'from_encoding': encoding} if encoding and isinstance(html, bytes) else {}
+    # Try using lxml parser, fallback to html.parser if unavailable
+    try:
+        soup = BeautifulSoup(html, 'lxml', **kwargs)
+    except Exception:
+        print("lxml parser not found or failed, falling back to html.parser")
+        soup = BeautifulSoup(html, 'html.parser', **kwargs)
+    parts, size = [], 0
+    for text in soup.stripped_strings:
+        parts.append(text)
+        size += len(text) + 1
+        if size >= max_chars:
+            break
+    return ' '.join(parts)[:max_chars]
+
+def html_to_text(html: Union[str, bytes], encoding: Optional[str] = None, max_chars: int = HTML_MAX_TEXT_CHARS,
+                 extractor: str = HTML_EXTRACTOR) -> str:
+    """
+    Extract the text of an HTML document.
+
+    Args:
+        html (str | bytes): The document.
+        encoding (Optional[str]): Charset from the Content-Type header.
+        max_chars (int): Stop collecting text once this many characters have been gathered.
+        extractor (str): 'lxml' for main-content extraction without boilerplate (falls back to
+            BeautifulSoup if it fails or finds less than MIN_MAIN_CHARS characters), 'bs4' for all visible text.
+
+    Returns:
+        str: The text, at most max_chars characters.
+    """
+    if extractor == 'lxml':
+        try:
+            text = lxml_html_to_text(html, encoding, max_chars)
+            if text:
+                return text
+        except Exception as e:
+            print(f"lxml extraction failed, falling back to BeautifulSoup: {e}")
+    return bs4_html_to_text(html, encoding, max_chars)
+
+def select_context(text: str, snippet: Optional[str] = None) -> str:
+    """Keep the context around the snippet, or the beginning of the text when no snippet is given."""
+    if snippet:
+        success, context = extract_passages_with_context(text, snippet)
+        if success:
+            return context
+        else:
+            return text
+    else:
+        # If no snippet is provided, return directly
+        return text[:8000]
+
+def make_fetch_result(text: str = '', not_modified: bool = False, etag: Optional[str] = None,
+                      last_modified: Optional[str] = None, fetched_time: Optional[str] = None,
+                      failure: Optional[str] = None) -> Dict[str, Any]:
+    """Build the result dictionary shared by `fetch_url` and the async fetch engine."""
+    return {
+        'text': text,
+        'not_modified': not_modified,
+        'etag': etag,
+        'last_modified': last_modified,
+        'fetched_time': fetched_time,
+        'failure': failure,
+    }
+
+def http_failure_kind(status_code: int) -> str:
+    """Failure kind of an HTTP error status."""
+    return 'http_4xx' if 400 <= status_code < 500 else 'http_5xx'
+
+def failure_kind(result: Dict[str, Any]) -> Optional[str]:
+    """
+    Classify a fetch result for the negative cache.
+
+    Returns:
+        Optional[str]: 'http_4xx', 'http_5xx', 'timeout', 'connection', 'too_large', 'empty' or 'error',
+        None if the fetch succeeded or the page was not modified.
+    """
+    if result.get('failure'):
+        return result['failure']
+    if result['not_modified']:
+        return None
+    if not result['text'].strip():
+        return 'empty'
+    if result['text'].startswith(EXTRACT_ERROR_MAKER) or result['text'].startswith('Error fetching'):
+        return 'error'
+    return None
+
+def conditional_headers(validators: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """Build If-None-Match / If-Modified-Since headers from stored validators."""
+    request_headers = {}
+    if validators:
+        if validators.get('etag'):
+            request_headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            request_headers['If-Modified-Since'] = validators['last_modified']
+    return request_headers
+
+def _fetch_with_engine(urls, use_jina=False, jina_api_key=None, snippets: Optional[dict] = None,
+                       validators: Optional[dict] = None, reader_url: str = JINA_READER_URL, max_workers: int = 32,
+                       progress: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    Run the async `fetch_engine.FetchEngine` (the backend chain used by the service) for the
+    synchronous helpers below. Call them from scripts, not from a running event loop.
+    """
+    # 延迟导入：fetch_engine 与 extract_backends 依赖本模块
+    from extract_backends import create_extractor
+    from fetch_engine import FetchEngine
+
+    async def run() -> Dict[str, Dict[str, Any]]:
+        names = ['reader', 'pdf', 'html'] if use_jina else ['pdf', 'html']
+        engine = FetchEngine([
+            create_extractor(name, api_key=jina_api_key or '', endpoint=reader_url) if name == 'reader' else create_extractor(name)
+            for name in names
+        ], max_concurrency=max_workers)
+        results = {}
+        try:
+            with tqdm(desc="Fetching URLs", total=len(urls), disable=not progress) as progress_bar:
+                async with aclosing(engine.fetch_iter(urls, snippets, validators)) as fetched:
+                    async for url, result in fetched:
+                        results[url] = result
+                        progress_bar.update()
+        finally:
+            await engine.aclose()
+        return results
+
+    return asyncio.run(run())
+
+def fetch_url(url, use_jina=False, jina_api_key=None, snippet: Optional[str] = None,
+              validators: Optional[Dict[str, Any]] = None, reader_url: str = JINA_READER_URL) -> Dict[str, Any]:
+    """
+    Fetch a URL and extract its text, optionally as a conditional request.
+
+    A synchronous wrapper of `fetch_engine.FetchEngine.fetch`: with use_jina the reader service
+    is tried first and the page is downloaded directly when it fails.
+
+    Args:
+        url (str): URL of a webpage or PDF.
+        use_jina (bool): Whether to use Jina for extraction (conditional requests are not supported there).
+        snippet (Optional[str]): The snippet to search for.
+        validators (Optional[dict]): Stored 'etag' / 'last_modified' of the cached copy.
+        reader_url (str): Endpoint of the reader service, e.g. a local stub; the page URL is appended.
+
+    Returns:
+        dict: 'text' (extracted text, context or error message), 'not_modified' (True on a 304, in which
+        case nothing was downloaded or parsed), and the response validators 'etag', 'last_modified'
+        and 'fetched_time'.
+    """
+    return _fetch_with_engine(
+        [url], use_jina, jina_api_key,
+        {url: snippet} if snippet else None,
+        {url: validators} if validators else None,
+        reader_url,
+    )[url]
+
+def extract_text_from_url(url, use_jina=False, jina_api_key=None, snippet: Optional[str] = None,
+                          reader_url: str = JINA_READER_URL):
     """
     Extract text from a URL. If a snippet is provided, extract the context related to it.
 
@@ -169,54 +391,30 @@ def extract_text_from_url(url, use_jina=False, jina_api_key=None, snippet: Optio
         url (str): URL of a webpage or PDF.
         use_jina (bool): Whether to use Jina for extraction.
         snippet (Optional[str]): The snippet to search for.
+        reader_url (str): Endpoint of the reader service.
 
     Returns:
         str: Extracted text or context.
     """
-    try:
-        if use_jina:
-            jina_headers = {
-                'Authorization': f'Bearer {jina_api_key}',
-                'X-Return-Format': 'markdown',
-                # 'X-With-Links-Summary': 'true'
-            }
-            response = requests.get(f'https://r.jina.ai/{url}', headers=jina_headers).text
-            # Remove URLs
-            pattern = r"\(https?:.*?\)|\[https?:.*?\]"
-            text = re.sub(pattern, "", response).replace('---','-').replace('===','=').replace('   ',' ').replace('   ',' ')
-        else:
-            response = session.get(url, timeout=FEACH_HTTP_TIMEOUT)  # Set timeout 
-            response.raise_for_status()  # Raise HTTPError if the request failed
-            # Determine the content type
-            content_type = response.headers.get('Content-Type', '')
-            if 'pdf' in content_type:
-                # If it's a PDF file, extract PDF text
-                return extract_pdf_text(url)
-            # Try using lxml parser, fallback to html.parser if unavailable
-            try:
-                soup = BeautifulSoup(response.text, 'lxml')
-            except Exception:
-                print("lxml parser not found or failed, falling back to html.parser")
-                soup = BeautifulSoup(response.text, 'html.parser')
-            text = soup.get_text(separator=' ', strip=True)
-
-        if snippet:
-            success, context = extract_snippet_with_context(text, snippet)
-            if success:
-                return context
-            else:
-                return text
-        else:
-            # If no snippet is provided, return directly
-            return text[:8000]
-    except requests.exceptions.HTTPError as http_err:
-        return f"{EXTRACT_ERROR_MAKER}HTTP error occurred: {http_err}"
-    except requests.exceptions.ConnectionError:
-        return f"{EXTRACT_ERROR_MAKER}Error: Connection error occurred"
-    except requests.exceptions.Timeout:
-        return f"{EXTRACT_ERROR_MAKER}Error: Request timed out after {FEACH_HTTP_TIMEOUT} seconds"
-    except Exception as e:
-        return f"{EXTRACT_ERROR_MAKER}Unexpected error: {str(e)}"
+    return fetch_url(url, use_jina, jina_api_key, snippet, reader_url=reader_url)['text']
+
+def fetch_pages(urls, max_workers=32, use_jina=False, jina_api_key=None, snippets: Optional[dict] = None,
+                validators: Optional[dict] = None, reader_url: str = JINA_READER_URL) -> Dict[str, Dict[str, Any]]:
+    """
+    Concurrently fetch multiple URLs, sending conditional requests for those with stored validators.
+
+    Args:
+        urls (list): List of URLs to scrape.
+        max_workers (int): Maximum number of requests in flight.
+        use_jina (bool): Whether to use Jina for extraction.
+        snippets (Optional[dict]): A dictionary mapping URLs to their respective snippets.
+        validators (Optional[dict]): A dictionary mapping URLs to their stored 'etag' / 'last_modified'.
+        reader_url (str): Endpoint of the reader service.
+
+    Returns:
+        dict: A dictionary mapping URLs to `fetch_url` results.
+    """
+    return _fetch_with_engine(list(urls), use_jina, jina_api_key, snippets, validators, reader_url, max_workers, progress=True)
 
 def fetch_page_content(urls, max_workers=32, use_jina=False, jina_api_key=None, snippets: Optional[dict] = None):
     """
@@ -231,19 +429,5 @@ def fetch_page_content(urls, max_workers=32, use_jina=False, jina_api_key=None,
     Returns:
         dict: A dictionary mapping URLs to the extracted content or context.
     """
-    results = {}
-    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls)+1)) as executor:
-        # Use tqdm to display a progress bar
-        futures = {
-            executor.submit(extract_text_from_url, url, use_jina, jina_api_key, snippets.get(url) if snippets else None): url
-            for url in urls
-        }
-        for future in tqdm(as_completed(futures), desc="Fetching URLs", total=len(urls)):
-            url = futures[future]
-            try:
-                data = future.result()
-                results[url] = data
-            except Exception as exc:
-                results[url] = f"Error fetching {url}: {exc}"
-            time.sleep(0.2)  # Simple rate limiting TODO
-    return results
\ No newline at end of file
+    results = fetch_pages(urls, max_workers, use_jina, jina_api_key, snippets)
+    return {url: result['text'] for url, result in results.items()}
@@ -0,0 +1,200 @@
+import time
+import asyncio
+import weakref
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+import httpx
+
+from const import EXTRACT_ERROR_MAKER
+from fetch import make_fetch_result, http_failure_kind, failure_kind, clean_reader_text, html_to_text, select_context, \
+                  pdf_bytes_to_text, ResponseTooLarge
+from extract_backends import ExtractBackend, create_extractor
+from parse_pool import ParsePool
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter: on average `rate` acquisitions per second, with bursts
+    of up to `capacity`. Waiters are served in arrival order.
+    """
+    def __init__(self, rate: float, capacity: Optional[float]=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """取得一个令牌，令牌不足时等待补充"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _parse(kind: str, body: bytes, encoding: Optional[str], snippet: Optional[str]) -> str:
+    """解析已下载的响应体（在解析进程池或工作线程中执行，不阻塞事件循环）"""
+    if kind == 'pdf':
+        return pdf_bytes_to_text(body)
+    if kind == 'reader':
+        text = clean_reader_text(body.decode(encoding or 'utf-8', errors='replace'))
+    else:
+        text = html_to_text(body, encoding)
+    return select_context(text, snippet)
+
+
+class FetchEngine:
+    """
+    Asynchronous page fetcher.
+
+    Each URL goes through an ordered chain of extraction backends (see `extract_backends`):
+    when a backend fails, exceeds its time limit or yields no text, the next backend that
+    accepts the URL and uses a different transport is tried (a failed direct download is
+    not repeated by another direct backend). Backends keep their own pooled connections; requests are
+    bounded by a global and a per-host concurrency limit and paced by a token bucket.
+    Parsing runs in the parse pool (processes or threads) after the download has released
+    its concurrency slot. Results have the same shape as `fetch.fetch_url`.
+    """
+    def __init__(
+            self,
+            backends: Optional[List[ExtractBackend]]=None,
+            max_concurrency: int=32,
+            per_host_concurrency: int=4,
+            rate_per_second: Optional[float]=20.0,
+            burst: Optional[float]=None,
+            parse_pool: Optional[ParsePool]=None
+        ):
+        """
+        Args:
+            backends (list): Extraction backends in the order they are tried, defaults to pdf, html.
+            max_concurrency (int): Maximum number of requests in flight.
+            per_host_concurrency (int): Maximum number of requests in flight per host.
+            rate_per_second (float): Average request rate, None for no rate limit.
+            burst (float): Token bucket capacity, defaults to rate_per_second.
+            parse_pool (ParsePool): Where downloaded bodies are parsed, None for worker threads.
+        """
+        self.backends = backends if backends is not None else [create_extractor('pdf'), create_extractor('html')]
+        self.max_concurrency = max_concurrency
+        self.per_host_concurrency = per_host_concurrency
+        self.parse_pool = parse_pool or ParsePool(workers=0)
+        self._global_limit = asyncio.Semaphore(max_concurrency)
+        # 弱引用：只有正在使用（持有或等待）的主机信号量保留，空闲主机的信号量随即回收，长期运行时不会无限增长
+        self._host_limits: 'weakref.WeakValueDictionary[str, asyncio.Semaphore]' = weakref.WeakValueDictionary()
+        self._bucket = TokenBucket(rate_per_second, burst) if rate_per_second else None
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        """获取 URL 所在主机的并发限制"""
+        host = (urlsplit(url).hostname or '').lower()
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = asyncio.Semaphore(self.per_host_concurrency)
+        return limit
+
+    async def aclose(self) -> None:
+        """关闭各提取后端的 HTTP 客户端（应用关闭时调用）"""
+        for backend in self.backends:
+            await backend.aclose()
+
+    async def _fetch_with(
+            self,
+            backend: ExtractBackend,
+            url: str,
+            snippet: Optional[str]=None,
+            validators: Optional[Dict[str, Any]]=None
+        ) -> Dict[str, Any]:
+        """使用单个提取后端下载并解析 URL"""
+        result = make_fetch_result(fetched_time=datetime.now().isoformat())
+        try:
+            async with self._global_limit, self._host_limit(backend.request_url(url)):
+                if self._bucket:
+                    await self._bucket.acquire()
+                # 限制整个下载的耗时（httpx 的超时只作用于单次读写）
+                download = await asyncio.wait_for(backend.download(url, validators), backend.timeout)
+            result['etag'] = download['etag']
+            result['last_modified'] = download['last_modified']
+            if download['not_modified']:
+                result['not_modified'] = True
+                return result
+            result['text'] = await self.parse_pool.run(
+                _parse, download['kind'], download['body'], download['encoding'], snippet
+            )
+        except httpx.HTTPStatusError as http_err:
+            result['text'] = f"{EXTRACT_ERROR_MAKER}HTTP error occurred: {http_err}"
+            result['failure'] = http_failure_kind(http_err.response.status_code)
+        except (httpx.TimeoutException, asyncio.TimeoutError):
+            result['text'] = f"{EXTRACT_ERROR_MAKER}Error: Request timed out after {backend.timeout} seconds"
+            result['failure'] = 'timeout'
+        except httpx.TransportError:
+            result['text'] = f"{EXTRACT_ERROR_MAKER}Error: Connection error occurred"
+            result['failure'] = 'connection'
+        except ResponseTooLarge as e:
+            result['text'] = f"{EXTRACT_ERROR_MAKER}Error: {str(e)}"
+            result['failure'] = 'too_large'
+        except Exception as e:
+            result['text'] = f"{EXTRACT_ERROR_MAKER}Unexpected error: {str(e)}"
+        return result
+
+    async def fetch(
+            self,
+            url: str,
+            snippet: Optional[str]=None,
+            validators: Optional[Dict[str, Any]]=None
+        ) -> Dict[str, Any]:
+        """
+        Fetch a URL and extract its text, trying the backends in order; see `fetch.fetch_url`
+        for the arguments and result. The result of the last backend tried is returned when all fail.
+        """
+        result = make_fetch_result(f"{EXTRACT_ERROR_MAKER}Error: No extraction backend accepts {url}", failure='error')
+        tried_transports = set()
+        for backend in self.backends:
+            # 同一传输方式的后端请求的是同一个地址：失败后（死链、超大、超时等）不再重复下载
+            if not backend.accepts(url) or backend.transport in tried_transports:
+                continue
+            tried_transports.add(backend.transport)
+            result = await self._fetch_with(backend, url, snippet, validators)
+            if failure_kind(result) is None:
+                break
+            print(f"Extraction with {backend.name} failed for {url}: {failure_kind(result)}")
+        return result
+
+    async def fetch_iter(
+            self,
+            urls: List[str],
+            snippets: Optional[Dict[str, str]]=None,
+            validators: Optional[Dict[str, Dict[str, Any]]]=None,
+            timeout: Optional[float]=None
+        ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Concurrently fetch multiple URLs, yielding (url, result) as each fetch completes.
+
+        Fetches still running when `timeout` seconds have passed, or when the consumer stops
+        iterating (use ``contextlib.aclosing``), are cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+        tasks = {
+            asyncio.ensure_future(self.fetch(
+                url,
+                snippets.get(url) if snippets else None,
+                validators.get(url) if validators else None,
+            )): url
+            for url in dict.fromkeys(urls)
+        }
+        pending = set(tasks)
+        try:
+            while pending:
+                remaining = deadline - loop.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield tasks[task], task.result()
+        finally:
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,96 @@
+import re
+import hashlib
+from typing import Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+FINGERPRINT_BITS = 64
+NUM_BANDS = 4  # 汉明距离 <= NUM_BANDS - 1 的两个指纹至少有一段 16 位完全相同
+BAND_BITS = FINGERPRINT_BITS // NUM_BANDS
+NEAR_DUPLICATE_DISTANCE = 3
+SHINGLE_SIZE = 4
+MAX_FINGERPRINT_CHARS = 4000  # 近似重复判断只需开头部分，限制计算量
+
+# 不影响页面内容的跟踪参数
+TRACKING_PARAMS = re.compile(r'^(utm_\w+|spm|from|source|ref|share_token|fbclid|gclid)$', re.IGNORECASE)
+
+
+def _shingles(text: str) -> Iterable[str]:
+    """规范化文本并切分为字符 n-gram（对中英文均适用）"""
+    text = re.sub(r'[\W_]+', '', text.casefold())[:MAX_FINGERPRINT_CHARS]
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+def simhash(text: Optional[str]) -> Optional[int]:
+    """
+    Compute a 64-bit SimHash of the text; near-duplicate texts have fingerprints
+    within a small Hamming distance. Returns None for empty text.
+    """
+    if not text:
+        return None
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for shingle in _shingles(text)
+    ]
+    if not hashes:
+        return None
+    threshold = len(hashes) / 2
+    fingerprint = 0
+    for bit in range(FINGERPRINT_BITS):
+        if sum((h >> bit) & 1 for h in hashes) > threshold:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+def hamming_distance(a: int, b: int) -> int:
+    """两个指纹的汉明距离"""
+    return bin((a ^ b) & ((1 << FINGERPRINT_BITS) - 1)).count('1')
+
+def is_near_duplicate(a: Optional[int], b: Optional[int], max_distance: int=NEAR_DUPLICATE_DISTANCE) -> bool:
+    """判断两个指纹是否近似重复"""
+    return a is not None and b is not None and hamming_distance(a, b) <= max_distance
+
+def fingerprint_bands(fingerprint: int) -> List[int]:
+    """将指纹切分为 NUM_BANDS 段，用于索引查找候选"""
+    mask = (1 << BAND_BITS) - 1
+    return [(fingerprint >> (i * BAND_BITS)) & mask for i in range(NUM_BANDS)]
+
+def to_signed(fingerprint: Optional[int]) -> Optional[int]:
+    """SQLite INTEGER 为有符号 64 位，存储前转换"""
+    if fingerprint is None:
+        return None
+    return fingerprint - (1 << 64) if fingerprint >= (1 << 63) else fingerprint
+
+def to_unsigned(value: Optional[int]) -> Optional[int]:
+    """to_signed 的逆变换"""
+    if value is None:
+        return None
+    return value + (1 << 64) if value < 0 else value
+
+def canonicalize_url(url: str) -> str:
+    """
+    规范化 URL 作为去重键：忽略协议（http/https）、www 前缀、默认端口、片段、
+    跟踪参数、查询参数顺序与末尾斜杠
+    """
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f'{host}:{parts.port}'
+    path = re.sub(r'/+$', '', parts.path) or ''
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not TRACKING_PARAMS.match(k)
+    ))
+    return f'{host}{path}' + (f'?{query}' if query else '')
+
+def find_near_duplicate(fingerprint: Optional[int], seen: List[Tuple[int, int]]) -> Optional[int]:
+    """在 (指纹, 序号) 列表中查找与 fingerprint 近似重复的项，返回其序号"""
+    if fingerprint is None:
+        return None
+    for other, index in seen:
+        if is_near_duplicate(fingerprint, other):
+            return index
+    return None
@@ -0,0 +1,130 @@
+import re
+from typing import Optional, Union
+from lxml import etree
+from lxml import html as lxml_html
+
+# 整体移除的非正文标签
+BOILERPLATE_TAGS = (
+    'script', 'style', 'noscript', 'template', 'svg', 'canvas', 'iframe', 'object', 'form',
+    'button', 'select', 'nav', 'footer', 'aside', 'dialog',
+)
+# class/id 中出现这些词的元素视为导航、横幅、分享栏等样板内容
+BOILERPLATE_TOKENS = {
+    'cookie', 'cookies', 'consent', 'gdpr', 'banner', 'breadcrumb', 'breadcrumbs', 'nav', 'navbar',
+    'navigation', 'menu', 'footer', 'sidebar', 'share', 'sharing', 'social', 'comment', 'comments',
+    'advert', 'advertisement', 'ads', 'ad', 'popup', 'modal', 'newsletter', 'subscribe', 'related',
+    'recommend', 'promo', 'sponsor', 'toolbar', 'login', 'signup',
+}
+# 正文候选块：统计其中文本段落的长度
+CONTENT_BLOCK_TAGS = ('p', 'pre', 'blockquote', 'li', 'td', 'h1', 'h2', 'h3', 'dd')
+MIN_BLOCK_CHARS = 25
+MIN_MAIN_CHARS = 200  # 识别出的正文块过短时退回整个 body；body 文本（不含标题）仍过短时返回空，由 BeautifulSoup 全文提取兜底
+MAIN_SCORE_RATIO = 0.6
+
+_TOKEN_SPLIT = re.compile(r'[\s_\-:]+')
+_HIDDEN_STYLE = re.compile(r'display\s*:\s*none|visibility\s*:\s*hidden', re.IGNORECASE)
+
+
+def _is_boilerplate(element: etree._Element) -> bool:
+    """根据 class/id/role 与隐藏属性判断是否为样板元素"""
+    if element.get('hidden') is not None or element.get('aria-hidden') == 'true':
+        return True
+    if _HIDDEN_STYLE.search(element.get('style', '')):
+        return True
+    if element.get('role') in ('navigation', 'banner', 'contentinfo', 'complementary', 'dialog', 'alert'):
+        return True
+    tokens = set(_TOKEN_SPLIT.split(f"{element.get('class', '')} {element.get('id', '')}".lower()))
+    return not tokens.isdisjoint(BOILERPLATE_TOKENS)
+
+def _text_length(element: etree._Element) -> int:
+    return len(' '.join(element.text_content().split()))
+
+def _block_score(block: etree._Element) -> float:
+    """正文候选块的得分：文本长度按链接文本占比降权；过短的块得 0 分"""
+    length = _text_length(block)
+    if length < MIN_BLOCK_CHARS:
+        return 0.0
+    link_length = sum(_text_length(link) for link in block.iter('a'))
+    return length * (1 - link_length / length)
+
+def _remove_boilerplate(root: etree._Element) -> None:
+    """移除样板标签与样板元素（保留其后的 tail 文本）"""
+    for element in list(root.iter(*BOILERPLATE_TAGS)):
+        element.drop_tree()
+    # 页面级 header 是站点导航，article/main 内的 header 通常包含标题
+    for element in root.xpath('//header[not(ancestor::article) and not(ancestor::main)]'):
+        element.drop_tree()
+    # 包含得分最高的正文块的元素不移除：如 class="wrapper has-sidebar" 的正文容器
+    best_block = max(root.iter(*CONTENT_BLOCK_TAGS), key=_block_score, default=None)
+    protected = {best_block, *best_block.iterancestors()} if best_block is not None else set()
+    for element in root.xpath('//body//*[@class or @id or @role or @style or @hidden or @aria-hidden]'):
+        if element.tag in ('article', 'main') or element in protected or element.getparent() is None:
+            continue
+        if _is_boilerplate(element):
+            element.drop_tree()
+
+def _main_content(root: etree._Element) -> etree._Element:
+    """
+    定位正文节点：优先使用 article/main 语义标签；否则按文本密度为段落打分（按链接文本占比降权），
+    取包含至少 MAIN_SCORE_RATIO 总分的最深节点（多个帖子、多个段落的共同容器）
+    """
+    for xpath in ('//article', '//main', '//*[@role="main"]'):
+        nodes = root.xpath(xpath)
+        if nodes:
+            best = max(nodes, key=_text_length)
+            if _text_length(best) >= MIN_MAIN_CHARS:
+                return best
+    scores, total = {}, 0.0
+    for block in root.iter(*CONTENT_BLOCK_TAGS):
+        score = _block_score(block)
+        if not score:
+            continue
+        total += score
+        for node in (block, *block.iterancestors()):
+            scores[node] = scores.get(node, 0) + score
+    candidates = [node for node, score in scores.items() if total and score >= MAIN_SCORE_RATIO * total]
+    if candidates:
+        best = max(candidates, key=lambda node: (sum(1 for _ in node.iterancestors()), scores[node]))
+        if _text_length(best) >= MIN_MAIN_CHARS:
+            return best
+    body = root.find('body')
+    return body if body is not None else root
+
+def lxml_html_to_text(html: Union[str, bytes], encoding: Optional[str]=None, max_chars: int=50000) -> str:
+    """
+    Extract the main-content text of an HTML document with an lxml tree walk.
+
+    Navigation, headers/footers, sidebars, cookie banners, forms and hidden elements are
+    removed, the main content block is located (semantic tags first, then text density)
+    and its text is collected until max_chars characters have been gathered. The page
+    title is kept as the first line. If the text found (without the title) is shorter
+    than MIN_MAIN_CHARS the extraction is considered failed and '' is returned, so the
+    caller can fall back to the full page text.
+
+    Args:
+        html (str | bytes): The document; bytes are decoded using `encoding` or the document's own declaration.
+        encoding (Optional[str]): Charset from the Content-Type header.
+        max_chars (int): Stop collecting text once this many characters have been gathered.
+
+    Returns:
+        str: The text, at most max_chars characters; empty if too little text was found.
+    """
+    if isinstance(html, bytes):
+        parser = lxml_html.HTMLParser(encoding=encoding, remove_comments=True, remove_pis=True)
+    else:
+        parser = lxml_html.HTMLParser(remove_comments=True, remove_pis=True)
+    root = lxml_html.document_fromstring(html, parser=parser)
+    title = ' '.join((root.findtext('.//title') or '').split())
+    _remove_boilerplate(root)
+    parts, size = [], 0
+    for text in _main_content(root).itertext():
+        text = ' '.join(text.split())
+        if not text:
+            continue
+        parts.append(text)
+        size += len(text) + 1
+        if size >= max_chars:
+            break
+    if size < min(MIN_MAIN_CHARS, max_chars):
+        return ''
+    return ' '.join([title] + parts if title else parts)[:max_chars]
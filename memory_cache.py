@@ -0,0 +1,127 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU with byte-size accounting and per-entry expiry.
+
+    Values are stored as-is (already deserialized), so a hit costs no I/O and no JSON
+    parsing; callers must treat returned values as read-only. The size of each entry is
+    supplied by the caller (e.g. the length of its serialized form).
+
+    Read-through fills are versioned: a reader takes `generation()` before querying the
+    backing store and passes it to `put`; the fill is dropped if the key was invalidated
+    or written since, so a value read before a concurrent write never outlives it.
+    """
+    MAX_TRACKED_CHANGES = 10000  # 记录最近变更代数的键数上限，超出后更早的变更按最旧记录的代数保守处理
+    def __init__(self, max_bytes: int, ttl_seconds: Optional[float]=None):
+        """
+        Args:
+            max_bytes (int): Upper bound of the summed entry sizes; least recently used entries are evicted beyond it.
+            ttl_seconds (float): Default lifetime of an entry, None for no expiry.
+        """
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: 'OrderedDict[Hashable, Tuple[Any, int, Optional[float]]]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # 失效代数：每次失效或直接写入加一，并记在该键上；未记录的键视为在 _changed_floor 时变更过
+        self._generation = 0
+        self._changed: 'OrderedDict[Hashable, int]' = OrderedDict()
+        self._changed_floor = 0
+
+    def get(self, key: Hashable, predicate: Optional[Callable[[Any], bool]]=None) -> Optional[Any]:
+        """
+        获取未过期的缓存值；若提供 predicate，则只有 predicate(value) 为真才算命中
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, _, expires_at = entry
+                if expires_at is not None and expires_at <= time.time():
+                    self._remove(key)
+                elif predicate is None or predicate(value):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def generation(self) -> int:
+        """当前失效代数：从数据源读取前获取，回填时传给 put"""
+        with self._lock:
+            return self._generation
+
+    def put(self, key: Hashable, value: Any, size: int, expires_at: Optional[float]=None,
+            generation: Optional[int]=None) -> None:
+        """
+        写入缓存；expires_at 为绝对时间戳，缺省使用 ttl_seconds。
+        generation 为读取数据源前取得的 `generation()`（回填）：该键此后被失效或写入过则不写入；
+        不提供 generation 表示写入的是最新值（写穿）
+        """
+        if expires_at is None and self.ttl_seconds is not None:
+            expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            if generation is not None:
+                if self._changed.get(key, self._changed_floor) > generation:
+                    return
+            else:
+                self._mark_changed(key)
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes or (expires_at is not None and expires_at <= time.time()):
+                return
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """删除单个缓存项；此前开始的回填不再写入"""
+        with self._lock:
+            self._mark_changed(key)
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self) -> None:
+        """清空缓存（统计计数保留）；此前开始的回填不再写入"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._generation += 1
+            self._changed.clear()
+            self._changed_floor = self._generation
+
+    def _mark_changed(self, key: Hashable) -> None:
+        self._generation += 1
+        self._changed[key] = self._generation
+        self._changed.move_to_end(key)
+        if len(self._changed) > self.MAX_TRACKED_CHANGES:
+            _, generation = self._changed.popitem(last=False)
+            self._changed_floor = generation
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> Dict[str, Any]:
+        """命中/未命中等统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
@@ -0,0 +1,88 @@
+import os
+import asyncio
+import importlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional, Sequence
+
+
+def _preload(modules: Sequence[str], initializer: Optional[Callable[..., Any]], initargs: tuple) -> None:
+    """工作进程启动时预先导入解析模块并执行 initializer（如加载分词器），避免首个请求承担这些开销"""
+    for module in modules:
+        importlib.import_module(module)
+    if initializer is not None:
+        initializer(*initargs)
+
+def _noop() -> None:
+    pass
+
+
+class ParsePool:
+    """
+    Offloads CPU-bound parsing (HTML/PDF text extraction, snippet matching) from the event loop.
+
+    With ``workers > 0`` calls run in a process pool, so parsing is not serialized by the
+    GIL and uses all cores; with ``workers == 0`` they run in worker threads. Functions and
+    arguments must be picklable: pass raw bytes/str in and get text back.
+
+    Worker processes are started with forkserver/spawn, which re-import the program's main
+    module as ``__mp_main__``: the main module must not do expensive setup at import time
+    (run the service through ``uvicorn web_search:app``, not with web_search as ``__main__``).
+    """
+    def __init__(
+            self,
+            workers: Optional[int]=None,
+            preload: Sequence[str]=(),
+            initializer: Optional[Callable[..., Any]]=None,
+            initargs: tuple=()
+        ):
+        """
+        Args:
+            workers (int): Number of worker processes, None for one per CPU, 0 to parse in threads.
+            preload (Sequence[str]): Modules each worker process imports when it starts.
+            initializer (Callable): Picklable function each worker process calls after the imports,
+                e.g. to load state it caches (with 0 workers it is called once in a thread by `warm_up`).
+            initargs (tuple): Arguments of the initializer.
+        """
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.preload = tuple(preload)
+        self.initializer = initializer
+        self.initargs = tuple(initargs)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """惰性创建进程池；不使用 fork，避免复制服务进程中的线程、连接和锁"""
+        if self._executor is None:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context(method),
+                initializer=_preload, initargs=(self.preload, self.initializer, self.initargs),
+            )
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """在进程池（或线程）中执行 fn(*args)"""
+        if self.workers == 0:
+            return await asyncio.to_thread(fn, *args)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        except BrokenProcessPool:
+            # 工作进程异常退出后进程池不可再用：关闭旧进程池（回收管理线程与剩余进程），下次调用时重建
+            executor, self._executor = self._executor, None
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    async def warm_up(self) -> None:
+        """启动工作进程并完成预导入与 initializer（应用启动时调用），使首个请求不必等待进程冷启动"""
+        if self.workers > 0:
+            await asyncio.gather(*(self.run(_noop) for _ in range(self.workers)))
+        elif self.initializer is not None:
+            await asyncio.to_thread(self.initializer, *self.initargs)
+
+    def shutdown(self, wait: bool=True) -> None:
+        """关闭进程池（应用关闭时调用）"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
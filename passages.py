@@ -0,0 +1,173 @@
+import re
+import math
+from bisect import bisect_right
+from collections import Counter
+from itertools import repeat
+from typing import Dict, List, Tuple
+
+# 句子：在中文句末标点、后跟空白的英文句点/分号或换行处结束（小数、网址、缩写中的句点不断句）；
+# 以非空白、非句末标点的字符开始，末尾的空白在分句后去除
+_SENTENCE = re.compile(
+    r'[^\s。！？；!?.;](?:[^\n。！？；!?.;]+|[.;](?![\s”’"\')\]]))*'
+    r'(?:[。！？；!?]+[”’"\')\]」』]*|[.;]+[”’"\')\]]*)?'
+)
+MAX_SENTENCE_CHARS = 500  # 没有标点的长文本按空白切分为不超过该长度的片段
+# 词元：非 CJK 的连续字母数字；CJK 连续字符另行切分为二元组
+_CJK_CHARS = r'\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_CJK = re.compile(f'[{_CJK_CHARS}]')
+_WORD_CHAR = rf'[^\W_{_CJK_CHARS}]'
+_WORD = re.compile(_WORD_CHAR)
+_TOKEN = re.compile(rf'[{_CJK_CHARS}]+|{_WORD_CHAR}+')
+# 英文高频虚词：几乎出现在每个句子中，对排序没有帮助，却占据了大部分匹配位置
+STOPWORDS = frozenset((
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'been', 'but', 'by', 'can', 'do', 'for', 'from', 'has', 'have',
+    'he', 'her', 'his', 'i', 'if', 'in', 'into', 'is', 'it', 'its', 'not', 'of', 'on', 'or', 's', 'she', 'so',
+    'that', 'the', 'their', 'them', 'then', 'there', 'these', 'they', 'this', 'to', 'was', 'we', 'were',
+    'what', 'when', 'which', 'who', 'will', 'with', 'would', 'you', 'your',
+))
+# 转小写时长度会改变的字符（Unicode 中只有 'İ'，lower() 得到 'i' 加组合点）：先替换为单个字符，保持偏移一致
+_LENGTH_CHANGING_UPPER = '\u0130'
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def _split_long(text: str, start: int, end: int, spans: List[Tuple[int, int]]) -> None:
+    """将超长句子在空白处切分（找不到空白时硬切）"""
+    while end - start > MAX_SENTENCE_CHARS:
+        cut = text.rfind(' ', start + MAX_SENTENCE_CHARS // 2, start + MAX_SENTENCE_CHARS)
+        cut = cut if cut > start else start + MAX_SENTENCE_CHARS
+        spans.append((start, cut))
+        start = cut
+        while start < end and text[start].isspace():
+            start += 1
+    if end > start:
+        spans.append((start, end))
+
+def segment_sentences(text: str) -> List[Tuple[int, int]]:
+    """
+    Split text into sentences, returning their (start, end) character offsets in `text`.
+
+    Handles Chinese and English punctuation and line breaks; surrounding whitespace is
+    excluded from the spans and sentences longer than MAX_SENTENCE_CHARS are split at spaces.
+    """
+    spans = [match.span() for match in _SENTENCE.finditer(text)]
+    spans = [(start, end) if not text[end - 1].isspace() else (start, start + len(text[start:end].rstrip()))
+             for start, end in spans]
+    if any(end - start > MAX_SENTENCE_CHARS for start, end in spans):
+        split_spans = []
+        for start, end in spans:
+            _split_long(text, start, end, split_spans)
+        spans = split_spans
+    return spans
+
+def _lower(text: str) -> str:
+    """长度不变的小写转换，结果与原文逐字符对应"""
+    if _LENGTH_CHANGING_UPPER in text:
+        text = text.replace(_LENGTH_CHANGING_UPPER, 'i')
+    return text.lower()
+
+def tokenize(text: str) -> List[str]:
+    """小写词元；CJK 文本没有空格分词，按相邻二字组切分"""
+    tokens = []
+    for run in _TOKEN.findall(text):
+        if _CJK.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(_lower(run))
+    return tokens
+
+def _term_positions(text: str, term: str) -> List[int]:
+    """查询词在全文中的出现位置：CJK 二字组允许重叠，单个 CJK 字符与其他词元需是完整词元"""
+    boundary = None if len(term) > 1 and _CJK.match(term) else (_CJK if _CJK.match(term) else _WORD)
+    positions, position = [], text.find(term)
+    while position >= 0:
+        if boundary is None or (
+            (position == 0 or not boundary.match(text, position - 1)) and not boundary.match(text, position + len(term))
+        ):
+            positions.append(position)
+        position = text.find(term, position + 1)
+    return positions
+
+def rank_passages(
+        text: str,
+        query: str,
+        top_k: int=3,
+        radius: int=1000,
+        min_coverage: float=0.2
+    ) -> List[Tuple[int, int, float]]:
+    """
+    Find the passages of `text` that best match `query`.
+
+    Sentences are scored with BM25 against the query terms: the occurrences of each query
+    term are found with a substring search over the whole text and assigned to sentences by
+    offset (an inverted index restricted to the query terms; sentence length is measured in
+    characters). The best sentences become passage anchors, expanded with neighbouring
+    sentences up to `radius` characters on each side; anchors inside an already selected
+    passage are skipped, so passages do not overlap.
+
+    Args:
+        text (str): The document text.
+        query (str): The text to match, e.g. a search snippet.
+        top_k (int): Maximum number of passages.
+        radius (int): Characters of context kept before and after each anchor sentence.
+        min_coverage (float): Minimum fraction of the distinct query terms an anchor sentence must contain.
+
+    Returns:
+        List[Tuple[int, int, float]]: (start, end, score) of the passages in document order;
+        empty if no sentence matches well enough.
+    """
+    query_terms = set(tokenize(query))
+    query_terms = (query_terms - STOPWORDS) or query_terms
+    spans = segment_sentences(text)
+    if not query_terms or not spans:
+        return []
+
+    # 倒排表：查询词 -> {句子序号: 词频}；在长度不变的小写文本上匹配，出现位置即原文偏移
+    lowered = _lower(text)
+    starts = [start for start, _ in spans]
+    postings: Dict[str, Dict[int, int]] = {}
+    for term in query_terms:
+        positions = _term_positions(lowered, term)
+        if positions:
+            # 查询词不含空白，出现位置总在某个句子内；bisect_right 返回句子序号 + 1
+            sentence_counts = Counter(map(bisect_right, repeat(starts), positions))
+            postings[term] = {index - 1: tf for index, tf in sentence_counts.items()}
+
+    sentence_count = len(spans)
+    average_length = sum(end - start for start, end in spans) / sentence_count
+    scores, matched = {}, {}
+    for term, entries in postings.items():
+        idf = math.log(1 + (sentence_count - len(entries) + 0.5) / (len(entries) + 0.5))
+        for index, tf in entries.items():
+            start, end = spans[index]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * (end - start) / average_length)
+            scores[index] = scores.get(index, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+            matched[index] = matched.get(index, 0) + 1
+
+    min_matched = max(1, math.ceil(min_coverage * len(query_terms)))
+    anchors = sorted(
+        (index for index, count in matched.items() if count >= min_matched),
+        key=lambda index: scores[index], reverse=True
+    )
+    passages = []  # (首句序号, 末句序号, 分数)
+    for anchor in anchors:
+        if len(passages) >= top_k:
+            break
+        if any(first <= anchor <= last for first, last, _ in passages):
+            continue
+        first = last = anchor
+        while first > 0 and spans[anchor][0] - spans[first - 1][0] <= radius:
+            first -= 1
+        while last + 1 < sentence_count and spans[last + 1][1] - spans[anchor][1] <= radius:
+            last += 1
+        # 不与已选段落重叠：截到相邻段落的边界
+        for other_first, other_last, _ in passages:
+            if other_last < anchor:
+                first = max(first, other_last + 1)
+            elif other_first > anchor:
+                last = min(last, other_first - 1)
+        passages.append((first, last, scores[anchor]))
+    return sorted((spans[first][0], spans[last][1], score) for first, last, score in passages)
@@ -1,8 +1,17 @@
 import json
+import asyncio
 import requests
-from typing import List
+from typing import Callable, List, Dict, Optional, Set
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from search_database_manager import SearchDatabaseManager
+from search_backends import SearchBackend
+from singleflight import AsyncSingleFlight
+from utils import normalize_query
+
+# 进程内相同 (规范化 query, num_results) 的并发上游请求合并为一次
+_search_flight = AsyncSingleFlight()
+# 正在进行的后台刷新任务（stale-while-revalidate），持有引用防止被回收
+_background_refreshes: Set[asyncio.Task] = set()
 
 
 def bocha_web_search(search_query: str, api_key: str, endpoint: str, num_results: int=10):
@@ -68,7 +77,8 @@ def process_search_queries(
         endpoint: str, 
         num_results_per_query: int=10, 
         max_workers: int=32,
-        search_db_manager: SearchDatabaseManager=None
+        search_db_manager: SearchDatabaseManager=None,
+        search_fn: Callable=bocha_web_search
     ):
     """
     Process multiple search queries concurrently using multi-threading.
@@ -78,6 +88,7 @@ def process_search_queries(
         api_key (str): The Bocha API key.
         endpoint (str): The Bocha API endpoint.
         num_results (int): The number of search results to retrieve.
+        search_fn (callable): The provider call, e.g. `bocha_web_search` or `tavily_web_search`.
 
     Returns:
         dict: A dictionary where the keys are the search queries and the values are the search results.
@@ -98,8 +109,7 @@ def process_search_queries(
         # Submit tasks to the executor
         future_to_query = {
             executor.submit(
-                # tavily_web_search, query, api_key, endpoint, num_results_per_query
-                bocha_web_search, query, api_key, endpoint, num_results_per_query
+                search_fn, query, api_key, endpoint, num_results_per_query
             ): query 
             for query in query_filtered
         }
@@ -124,3 +134,117 @@ def process_search_queries(
 
 
     return results
+
+
+async def _search_and_cache(
+        query: str,
+        backend: SearchBackend,
+        num_results: int,
+        search_db_manager: Optional[SearchDatabaseManager],
+        semaphore: Optional[asyncio.Semaphore]=None
+    ) -> Dict:
+    """Run one upstream search and write it to the cache; executed inside the single-flight."""
+    if semaphore:
+        async with semaphore:
+            response = await backend.search(query, num_results)
+    else:
+        response = await backend.search(query, num_results)
+    # Write the cache inside the flight so no caller slips in between the response and the write
+    if search_db_manager:
+        await asyncio.to_thread(search_db_manager.upsert, query, num_results, response)
+    return response
+
+def _schedule_refresh(
+        query: str,
+        backend: SearchBackend,
+        num_results: int,
+        search_db_manager: SearchDatabaseManager,
+        max_refreshes: int
+    ) -> bool:
+    """
+    Refresh a stale cache entry in the background.
+
+    Returns False (and does nothing) when `max_refreshes` refreshes are already running;
+    the entry stays stale and a later request will try again.
+    """
+    if len(_background_refreshes) >= max_refreshes:
+        return False
+
+    async def _refresh():
+        try:
+            await _search_flight.do(
+                (normalize_query(query), num_results), _search_and_cache,
+                query, backend, num_results, search_db_manager
+            )
+        except Exception as e:
+            print(f"Error refreshing stale query '{query}': {e!r}")
+
+    task = asyncio.create_task(_refresh())
+    _background_refreshes.add(task)
+    task.add_done_callback(_background_refreshes.discard)
+    return True
+
+async def async_process_search_queries(
+        search_queries: List[str],
+        backend: SearchBackend,
+        num_results_per_query: int=10,
+        max_concurrency: int=32,
+        search_db_manager: SearchDatabaseManager=None,
+        max_refreshes: int=4
+    ) -> Dict[str, Dict]:
+    """
+    Asynchronous version of `process_search_queries`, safe to await from the event loop.
+
+    All uncached queries are sent concurrently (bounded by `max_concurrency`) to the
+    search backend; SQLite cache access runs in a worker thread so it never
+    blocks the loop. Identical in-flight (normalized query, num_results) requests from concurrent
+    callers are coalesced into a single upstream call. When the cache has a
+    stale-while-revalidate window (`stale_days`), stale entries are returned right away
+    and refreshed in the background, with at most `max_refreshes` refreshes running.
+
+    Args:
+        search_queries (list): A list of search queries.
+        backend (SearchBackend): The search backend (possibly hedged) to query.
+        num_results_per_query (int): The number of search results to retrieve.
+        max_concurrency (int): Maximum number of in-flight search requests.
+        search_db_manager (SearchDatabaseManager): Optional search cache.
+        max_refreshes (int): Maximum number of concurrent background refreshes.
+
+    Returns:
+        dict: A dictionary where the keys are the search queries and the values are the normalized search results.
+    """
+    results = {}
+
+    if search_db_manager:
+        cached = await asyncio.to_thread(
+            lambda: {q: search_db_manager.get_with_staleness(q, num_results=num_results_per_query) for q in search_queries}
+        )
+        for query, hit in cached.items():
+            if not hit or not hit[0]: continue
+            results[query], is_stale = hit
+            if is_stale:
+                _schedule_refresh(
+                    query, backend, num_results_per_query, search_db_manager, max_refreshes
+                )
+    query_filtered = [q for q in dict.fromkeys(search_queries) if q not in results]
+
+    # If all queries have cached results, return directly
+    if len(query_filtered) == 0: return results
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+    responses = await asyncio.gather(
+        *(
+            _search_flight.do(
+                (normalize_query(q), num_results_per_query), _search_and_cache,
+                q, backend, num_results_per_query, search_db_manager, semaphore
+            ) for q in query_filtered
+        ),
+        return_exceptions=True
+    )
+    for query, response in zip(query_filtered, responses):
+        if isinstance(response, Exception):
+            print(f"Error processing query '{query}': {response!r}")
+            continue
+        results[query] = response
+
+    return results
@@ -0,0 +1,278 @@
+import json
+import time
+import asyncio
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Type
+import httpx
+from const import SEARCH_HTTP_TIMEOUT
+
+# 进程内共享的异步 HTTP 客户端（连接池复用），首次使用时在当前事件循环中创建
+_async_client: Optional[httpx.AsyncClient] = None
+
+# 已注册的搜索后端：name -> SearchBackend 子类
+SEARCH_BACKENDS: Dict[str, Type['SearchBackend']] = {}
+
+FAVICON_URL = 'https://t0.gstatic.com/faviconV2?client=SOCIAL&type=FAVICON&fallback_opts=TYPE,SIZE,URL&url={url}&size=64'
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """获取共享的异步 HTTP 客户端（带连接池，惰性创建）"""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            timeout=SEARCH_HTTP_TIMEOUT,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+        )
+    return _async_client
+
+async def close_async_client() -> None:
+    """关闭共享的异步 HTTP 客户端（应用关闭时调用）"""
+    global _async_client
+    if _async_client is not None and not _async_client.is_closed:
+        await _async_client.aclose()
+    _async_client = None
+
+def register_backend(name: str) -> Callable[[Type['SearchBackend']], Type['SearchBackend']]:
+    """注册搜索后端的类装饰器"""
+    def decorator(cls: Type['SearchBackend']) -> Type['SearchBackend']:
+        cls.name = name
+        SEARCH_BACKENDS[name] = cls
+        return cls
+    return decorator
+
+def create_backend(name: str, **kwargs) -> 'SearchBackend':
+    """根据注册名创建搜索后端实例"""
+    if name not in SEARCH_BACKENDS:
+        raise ValueError(f"Search backend {name} not found in SEARCH_BACKENDS")
+    return SEARCH_BACKENDS[name](**kwargs)
+
+def make_search_item(
+        url: str='',
+        title: str='',
+        site_name: str='',
+        site_icon: str='',
+        date: str='',
+        snippet: str='',
+        context: str=''
+    ) -> Dict[str, str]:
+    """构造统一格式的单条搜索结果"""
+    return {
+        'title': title,
+        'url': url,
+        'site_name': site_name,
+        'site_icon': site_icon,
+        'date': date,
+        'snippet': snippet,
+        'context': context,
+    }
+
+def is_normalized(search_results: Dict) -> bool:
+    """判断搜索结果是否已是统一格式"""
+    return 'backend' in search_results and 'items' in search_results
+
+def normalize_search_results(search_results: Dict, query: str='') -> Dict:
+    """
+    Convert a search response into the normalized result type.
+
+    Responses that are already normalized are returned unchanged; raw provider responses
+    (e.g. rows cached before the backend layer existed) are recognized by shape.
+
+    Args:
+        search_results (dict): A normalized result or a raw provider response.
+        query (str): The query that produced the response, if known.
+
+    Returns:
+        dict: ``{'query': str, 'backend': str, 'items': [item, ...]}``
+    """
+    if is_normalized(search_results):
+        return search_results
+    for backend_cls in SEARCH_BACKENDS.values():
+        if backend_cls.matches(search_results):
+            return backend_cls.normalize(search_results, query)
+    return {'query': query, 'backend': '', 'items': []}
+
+
+class SearchBackend:
+    """
+    Base class of a search provider.
+
+    Subclasses implement `raw_search` (one provider request) and `normalize` (provider
+    response -> normalized result type), and are registered with `register_backend`.
+    """
+    name: str = ''
+
+    def __init__(self, api_key: str='', endpoint: str='', timeout: float=SEARCH_HTTP_TIMEOUT):
+        self.api_key = api_key
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    async def raw_search(self, query: str, num_results: int) -> Dict:
+        raise NotImplementedError
+
+    @staticmethod
+    def matches(search_results: Dict) -> bool:
+        """判断原始响应是否来自该后端"""
+        return False
+
+    @classmethod
+    def normalize(cls, search_results: Dict, query: str='') -> Dict:
+        raise NotImplementedError
+
+    async def search(self, query: str, num_results: int) -> Dict:
+        """执行一次搜索并返回统一格式的结果"""
+        return self.normalize(await self.raw_search(query, num_results), query)
+
+
+@register_backend('bocha')
+class BochaBackend(SearchBackend):
+    async def raw_search(self, query: str, num_results: int) -> Dict:
+        payload = json.dumps({
+            'query': query,
+            'summary': True,
+            'freshness': 'noLimit',  # 支持 noLimit、oneDay、oneWeek、oneMonth、oneYear
+            'count': num_results
+        })
+        headers = {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        }
+        response = await get_async_client().post(self.endpoint, headers=headers, content=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json().get('data', {})
+
+    @staticmethod
+    def matches(search_results: Dict) -> bool:
+        return 'webPages' in search_results and 'value' in search_results['webPages']
+
+    @classmethod
+    def normalize(cls, search_results: Dict, query: str='') -> Dict:
+        items = [
+            make_search_item(
+                title=result.get('name', ''),
+                url=result.get('url', ''),
+                site_name=result.get('siteName', ''),
+                site_icon=result.get('siteIcon', ''),
+                date=result.get('dateLastCrawled', '').split('T')[0],
+                snippet=result.get('snippet', ''),
+            )
+            for result in search_results.get('webPages', {}).get('value', [])
+        ]
+        query = search_results.get('queryContext', {}).get('originalQuery', '') or query
+        return {'query': query, 'backend': cls.name, 'items': items}
+
+
+@register_backend('tavily')
+class TavilyBackend(SearchBackend):
+    async def raw_search(self, query: str, num_results: int) -> Dict:
+        payload = {
+            "query": query,
+            "search_depth": 'basic',
+            "topic": 'general',
+            "days": 3,
+            "include_answer": False,
+            "include_raw_content": True,
+            "max_results": num_results,
+            "include_domains": [],
+            "exclude_domains": [],
+            "include_images": False,
+        }
+        headers = {
+            "Content-Type": "application/json",
+            'Authorization': f'Bearer {self.api_key}'
+        }
+        response = await get_async_client().post(self.endpoint, headers=headers, content=json.dumps(payload), timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def matches(search_results: Dict) -> bool:
+        return 'results' in search_results
+
+    @classmethod
+    def normalize(cls, search_results: Dict, query: str='') -> Dict:
+        items = []
+        for result in search_results.get('results', []):
+            url = result.get('url', '')
+            items.append(make_search_item(
+                title=result.get('title', ''),
+                url=url,
+                site_name=result.get('siteName', ''),
+                site_icon=FAVICON_URL.format(url=url) if url else '',
+                date=result.get('date', ''),
+                snippet=result.get('content', ''),
+                context=result.get('raw_content', '') or '',
+            ))
+        return {'query': search_results.get('query', '') or query, 'backend': cls.name, 'items': items}
+
+
+class HedgedBackend(SearchBackend):
+    """
+    Hedged requests over two backends.
+
+    The primary is queried first. If it has not answered within the `percentile` of its
+    recent latencies (or fails), the secondary is fired as well and whichever answers
+    successfully first wins; the loser is cancelled.
+    """
+    def __init__(
+            self,
+            primary: SearchBackend,
+            secondary: SearchBackend,
+            percentile: float=0.95,
+            min_samples: int=20,
+            initial_delay: float=1.0,
+            window: int=200
+        ):
+        """
+        Args:
+            primary (SearchBackend): The backend normally answering queries.
+            secondary (SearchBackend): The backend fired when the primary is slow or fails.
+            percentile (float): Latency percentile of the primary after which to hedge.
+            min_samples (int): Samples needed before the percentile is trusted.
+            initial_delay (float): Hedge delay in seconds until `min_samples` are collected.
+            window (int): Number of recent primary latencies to keep.
+        """
+        super().__init__(timeout=max(primary.timeout, secondary.timeout))
+        self.name = f'hedged({primary.name},{secondary.name})'
+        self.primary = primary
+        self.secondary = secondary
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.hedged_count = 0
+
+    def hedge_delay(self) -> float:
+        """当前的对冲等待时间（秒）"""
+        if len(self.latencies) < self.min_samples:
+            return self.initial_delay
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+
+    async def _timed_primary(self, query: str, num_results: int) -> Dict:
+        start = time.monotonic()
+        result = await self.primary.search(query, num_results)
+        self.latencies.append(time.monotonic() - start)
+        return result
+
+    async def search(self, query: str, num_results: int) -> Dict:
+        primary_task = asyncio.create_task(self._timed_primary(query, num_results))
+        tasks: List[asyncio.Task] = [primary_task]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay())
+            if primary_task in done and primary_task.exception() is None:
+                return primary_task.result()
+
+            self.hedged_count += 1
+            tasks.append(asyncio.create_task(self.secondary.search(query, num_results)))
+            pending = {t for t in tasks if not t.done()}
+            while pending:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in tasks:
+                    if task.done() and task.exception() is None:
+                        return task.result()
+            # Both failed: surface the primary's error
+            raise primary_task.exception()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
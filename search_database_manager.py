@@ -1,14 +1,44 @@
 import json
+import threading
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, List, Generator
+from typing import Optional, Dict, Any, List, Generator, Tuple
 from contextlib import contextmanager
 import sqlite3
+from sqlite_pool import get_pool, database_size, incremental_vacuum
+from memory_cache import LRUCache
+from compression import compress_text, decompress_text
+from utils import normalize_query, truncate_search_results
 
 
 class SearchDatabaseManager:
-    def __init__(self, db_path: str="search_cache.db", outdated_days: int=3):
+    def __init__(
+            self,
+            db_path: str="search_cache.db",
+            outdated_days: int=3,
+            stale_days: int=0,
+            memory_cache_bytes: int=0,
+            compression: Optional[str]='zlib'
+        ):
+        """
+        Args:
+            db_path (str): SQLite 数据库路径
+            outdated_days (int): 缓存有效期（天）
+            stale_days (int): 过期后仍可作为陈旧结果返回的窗口（天），0 表示关闭 stale-while-revalidate
+            memory_cache_bytes (int): 内存 LRU 层的容量（字节），0 表示关闭
+            compression (str): results_json 字段的压缩算法（'zlib'/'zstd'），None 表示不压缩
+        """
         self.db_path = db_path
+        self.compression = compression
+        self._pool = get_pool(db_path)
         self.outdated_days = outdated_days
+        self.stale_days = stale_days
+        # 内存层：(normalized_query, num_results) -> (num_results, results, created_time)；
+        # 不同 num_results 的结果各占一项，互不覆盖。_memory_nums 为内存层中出现过的 num_results（只增不减，整体替换）
+        self._memory = LRUCache(memory_cache_bytes) if memory_cache_bytes > 0 else None
+        self._memory_nums: frozenset = frozenset()
+        # 命中时只在内存中记录访问时间，由 flush_access 批量写回 last_access
+        self._pending_access: Dict[str, str] = {}
+        self._access_lock = threading.Lock()
         self._init_db()
 
     def _init_db(self) -> None:
@@ -20,85 +50,273 @@ class SearchDatabaseManager:
                     num_results INTEGER NOT NULL,
                     results_json TEXT,
                     created_time TIMESTAMP,
+                    normalized_query TEXT,
+                    last_access TIMESTAMP,
                     PRIMARY KEY (original_query, num_results)
                 )
             ''')
+            self._migrate_normalized_query(conn)
+            self._migrate_last_access(conn)
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_search_cache_normalized
+                ON search_cache (normalized_query, num_results)
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_search_cache_last_access ON search_cache (last_access)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_search_cache_created ON search_cache (created_time)")
             conn.commit()
 
+    def _migrate_last_access(self, conn: sqlite3.Connection) -> None:
+        """为旧表补充 last_access 列，以 created_time 回填"""
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(search_cache)")}
+        if "last_access" not in columns:
+            conn.execute("ALTER TABLE search_cache ADD COLUMN last_access TIMESTAMP")
+        conn.execute("UPDATE search_cache SET last_access = created_time WHERE last_access IS NULL")
+
+    def _migrate_normalized_query(self, conn: sqlite3.Connection) -> None:
+        """为旧表补充 normalized_query 列并回填"""
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(search_cache)")}
+        if "normalized_query" not in columns:
+            conn.execute("ALTER TABLE search_cache ADD COLUMN normalized_query TEXT")
+        queries = [row["original_query"] for row in conn.execute(
+            "SELECT DISTINCT original_query FROM search_cache WHERE normalized_query IS NULL"
+        )]
+        conn.executemany(
+            "UPDATE search_cache SET normalized_query = ? WHERE original_query = ?",
+            [(normalize_query(q), q) for q in queries]
+        )
+
     @contextmanager
     def _get_connection(self) -> Generator[sqlite3.Connection, None, None]:
-        """获取数据库连接（上下文管理器）"""
-        conn = sqlite3.connect(self.db_path)
-        try:
-            conn.row_factory = sqlite3.Row  # 使查询结果支持字典访问
+        """获取数据库连接（上下文管理器），复用连接池中当前线程的持久连接"""
+        with self._pool.connection() as conn:
             yield conn
-        finally:
-            conn.close()
 
     def get(self, original_query: str, num_results: int) -> Optional[Dict]:
-        """获取有效缓存结果（3天内）"""
+        """
+        获取有效缓存结果（outdated_days 天内）
+
+        查询先做规范化，且任何 num_results 不少于请求数量的缓存都可命中，结果截断到请求数量
+        """
+        if cached := self._lookup(original_query, num_results, self.outdated_days):
+            return cached[0]
+        return None
+
+    def get_with_staleness(self, original_query: str, num_results: int) -> Optional[Tuple[Dict, bool]]:
+        """
+        获取缓存结果及其是否陈旧：超过 outdated_days 但仍在 stale_days 窗口内的结果标记为陈旧，
+        由调用方在后台刷新
+        """
+        if cached := self._lookup(original_query, num_results, self.outdated_days + self.stale_days):
+            results, created_time = cached
+            is_stale = datetime.now() - created_time > timedelta(days=self.outdated_days)
+            return results, is_stale
+        return None
+
+    def _lookup(self, original_query: str, num_results: int, max_age_days: int) -> Optional[Tuple[Dict, datetime]]:
+        """查询 max_age_days 天内最新的可用缓存（先查内存层），返回 (结果, 创建时间)"""
+        key = normalize_query(original_query)
+        cutoff = datetime.now() - timedelta(days=max_age_days)
+        if self._memory:
+            # 优先使用条数最接近的结果，截断最少
+            for cached_num in sorted(n for n in self._memory_nums if n >= num_results):
+                entry = self._memory.get((key, cached_num), lambda e: e[2] >= cutoff)
+                if entry:
+                    self._touch(key)
+                    _, results, created_time = entry
+                    if cached_num > num_results:
+                        results = truncate_search_results(results, num_results)
+                    return results, created_time
+        generation = self._memory.generation() if self._memory else None
         try:
             with self._get_connection() as conn:
                 cursor = conn.execute('''
-                    SELECT results_json, created_time 
-                    FROM search_cache 
-                    WHERE original_query = ? AND num_results = ?
-                ''', (original_query, num_results))
-                
+                    SELECT results_json, num_results, created_time
+                    FROM search_cache
+                    WHERE normalized_query = ? AND num_results >= ? AND created_time >= ?
+                    ORDER BY created_time DESC
+                    LIMIT 1
+                ''', (key, num_results, cutoff.isoformat()))
+
                 if row := cursor.fetchone():
-                    cache_time = datetime.fromisoformat(row["created_time"])
-                    if (datetime.now() - cache_time) <= timedelta(days=self.outdated_days):
-                        return json.loads(row["results_json"])
+                    self._touch(key)
+                    results_json = decompress_text(row["results_json"])
+                    results = json.loads(results_json)
+                    created_time = datetime.fromisoformat(row["created_time"])
+                    # 内存层保存的是解码后的结果，按未压缩的 JSON 长度计入容量
+                    self._remember(key, row["num_results"], results, len(results_json), created_time, generation)
+                    if row["num_results"] > num_results:
+                        results = truncate_search_results(results, num_results)
+                    return results, created_time
         except sqlite3.Error as e:
             print(f"Query error: {e}")
         return None
-    
+
+    def _remember(self, key: str, num_results: int, results: Dict, size: int, created_time: datetime,
+                  generation: Optional[int]=None) -> None:
+        """
+        写入内存层，过期时间与 outdated_days + stale_days 一致；generation 为从 SQLite 回填时读取前的
+        失效代数（读取期间该项被写入或删除时不回填），写穿时为 None
+        """
+        if not self._memory:
+            return
+        if num_results not in self._memory_nums:
+            self._memory_nums = self._memory_nums | {num_results}
+        expires_at = created_time + timedelta(days=self.outdated_days + self.stale_days)
+        self._memory.put(
+            (key, num_results), (num_results, results, created_time), size,
+            expires_at=expires_at.timestamp(), generation=generation
+        )
+
+    def compress_existing(self, batch_size: int=200) -> int:
+        """迁移：分批压缩尚未压缩的 results_json，返回处理的记录数"""
+        if self.compression is None:
+            return 0
+        total = 0
+        last_rowid = 0
+        while True:
+            with self._get_connection() as conn:
+                rows = conn.execute('''
+                    SELECT rowid, results_json FROM search_cache
+                    WHERE rowid > ? AND typeof(results_json) = 'text'
+                    ORDER BY rowid LIMIT ?
+                ''', (last_rowid, batch_size)).fetchall()
+                if not rows:
+                    return total
+                last_rowid = rows[-1]['rowid']
+                updates = [
+                    (compressed, row['rowid']) for row in rows
+                    if (compressed := compress_text(row['results_json'], self.compression)) is not row['results_json']
+                ]
+                conn.executemany("UPDATE search_cache SET results_json = ? WHERE rowid = ?", updates)
+                conn.commit()
+                total += len(updates)
+
+    def _touch(self, key: str) -> None:
+        """记录规范化查询的访问时间"""
+        with self._access_lock:
+            self._pending_access[key] = datetime.now().isoformat()
+
+    def flush_access(self) -> int:
+        """将缓冲的访问时间批量写回 last_access，返回写回条数"""
+        with self._access_lock:
+            pending, self._pending_access = self._pending_access, {}
+        if not pending:
+            return 0
+        try:
+            with self._get_connection() as conn:
+                conn.executemany(
+                    "UPDATE search_cache SET last_access = ? WHERE normalized_query = ? AND last_access < ?",
+                    [(ts, key, ts) for key, ts in pending.items()]
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Flush access time failed: {e}")
+            return 0
+        return len(pending)
+
+    def purge_expired(self) -> int:
+        """删除超过 outdated_days + stale_days 的记录，返回删除条数"""
+        cutoff = (datetime.now() - timedelta(days=self.outdated_days + self.stale_days)).isoformat()
+        return self._delete_where("created_time < ?", (cutoff,))
+
+    def enforce_size_limit(self, max_bytes: int, batch_size: int=200) -> int:
+        """按 LRU（last_access 最早优先）删除记录，直到数据库实际占用不超过 max_bytes，返回删除条数"""
+        self.flush_access()
+        deleted = 0
+        while True:
+            with self._get_connection() as conn:
+                if database_size(conn) <= max_bytes:
+                    return deleted
+            removed = self._delete_where(
+                "rowid IN (SELECT rowid FROM search_cache ORDER BY last_access LIMIT ?)", (batch_size,)
+            )
+            if removed == 0:
+                return deleted
+            deleted += removed
+
+    def incremental_vacuum(self, pages: int=256) -> int:
+        """小步归还空闲页，返回剩余空闲页数"""
+        with self._get_connection() as conn:
+            return incremental_vacuum(conn, pages)
+
+    def _delete_where(self, condition: str, params: tuple) -> int:
+        """按条件删除记录并使内存层失效，返回删除条数"""
+        try:
+            with self._get_connection() as conn:
+                keys = [(row['normalized_query'], row['num_results']) for row in conn.execute(
+                    f"DELETE FROM search_cache WHERE {condition} RETURNING normalized_query, num_results", params
+                ).fetchall()]
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Delete failed: {e}")
+            return 0
+        if self._memory:
+            for key in set(keys):
+                self._memory.invalidate(key)
+        return len(keys)
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """内存层的命中统计，未开启内存层时返回 None"""
+        return self._memory.stats() if self._memory else None
+
+    UPSERT_SQL = '''
+        INSERT INTO search_cache (
+            original_query, num_results, results_json, created_time, normalized_query, last_access
+        ) VALUES (?1, ?2, ?3, ?4, ?5, ?4)
+        ON CONFLICT(original_query, num_results) DO UPDATE SET
+            results_json = excluded.results_json,
+            created_time = excluded.created_time,
+            normalized_query = excluded.normalized_query,
+            last_access = excluded.last_access
+    '''
+
+    def _to_params(self, original_query: str, num_results: int, results_json: str) -> Tuple:
+        """转换为 UPSERT_SQL 的参数（results_json 为未压缩的 JSON）"""
+        return (
+            original_query,
+            num_results,
+            compress_text(results_json, self.compression),
+            datetime.now().isoformat(),
+            normalize_query(original_query)
+        )
+
     def upsert(self, original_query: str, num_results: int, results: Dict) -> bool:
         """原子化插入/更新单条记录"""
+        results_json = json.dumps(results)
+        params = self._to_params(original_query, num_results, results_json)
         try:
             with self._get_connection() as conn:
-                # 使用 REPLACE INTO 语句实现插入或更新：完全覆盖旧记录且不关心自增主键的变化
-                # conn.execute('''
-                #     INSERT OR REPLACE INTO search_cache 
-                #     VALUES (?, ?, ?, ?)
-                # ''', (
-                #     original_query,
-                #     num_results,
-                #     json.dumps(results),
-                #     datetime.now().isoformat()
-                # ))
                 # 使用 ON CONFLICT 语句实现插入或更新：只更新指定字段，不覆盖所有字段
-                conn.execute('''
-                    INSERT INTO search_cache (
-                        original_query, num_results, results_json, created_time
-                    ) VALUES (?, ?, ?, ?)
-                    ON CONFLICT(original_query, num_results) DO UPDATE SET
-                        results_json = excluded.results_json,
-                        created_time = excluded.created_time
-                ''', (
-                    original_query,
-                    num_results,
-                    json.dumps(results),
-                    datetime.now().isoformat()
-                ))
+                conn.execute(self.UPSERT_SQL, params)
                 conn.commit()
-                return True
         except sqlite3.Error as e:
             print(f"Upsert error: {e}")
             return False
+        self._remember_params(params, results, len(results_json))
+        return True
 
     def batch_upsert(self, data_list: List[Dict]) -> int:
-        """批量插入/更新记录（事务操作）"""
-        success_count = 0
+        """批量插入/更新记录（单连接、单事务、executemany）"""
+        self.flush_access()
+        if not data_list:
+            return 0
+        results_jsons = [json.dumps(data['results']) for data in data_list]
+        params = [
+            self._to_params(data['original_query'], data['num_results'], results_json)
+            for data, results_json in zip(data_list, results_jsons)
+        ]
         try:
             with self._get_connection() as conn:
-                conn.execute("BEGIN TRANSACTION")
-                for data in data_list:
-                    if self.upsert(**data):
-                        success_count += 1
+                conn.executemany(self.UPSERT_SQL, params)
                 conn.commit()
-                return success_count
         except sqlite3.Error as e:
             print(f"Batch upsert failed: {e}")
-            conn.rollback()
-            return 0
\ No newline at end of file
+            return 0
+        for param, data, results_json in zip(params, data_list, results_jsons):
+            self._remember_params(param, data['results'], len(results_json))
+        return len(params)
+
+    def _remember_params(self, params: Tuple, results: Dict, size: int) -> None:
+        """写穿：将刚写入 SQLite 的记录同步到内存层（size 为未压缩的 JSON 长度）"""
+        _, num_results, _, created_time, key = params
+        self._remember(key, num_results, results, size, datetime.fromisoformat(created_time))
@@ -0,0 +1,30 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class AsyncSingleFlight:
+    """
+    Coalesce concurrent calls that share the same key into one in-flight execution.
+
+    The first caller for a key starts the call as an independent task; every caller
+    that arrives while it is still running awaits the same task and receives the same
+    result (or exception). Cancelling one waiter does not cancel the shared call.
+    """
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """执行 fn(*args, **kwargs)，相同 key 的并发调用共享同一次执行结果"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 所有等待者都被取消时，避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,131 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Generator, List
+from compression import decompress_text
+
+# 每个数据库文件共享一个连接池：db_path -> SQLiteConnectionPool
+_pools: Dict[str, 'SQLiteConnectionPool'] = {}
+_pools_lock = threading.Lock()
+
+
+def register_functions(conn: sqlite3.Connection) -> None:
+    """
+    注册缓存数据库依赖的 SQL 函数：全文索引的视图 search_results_text 与 search_results 上的触发器
+    调用 decompress_text 读取压缩字段，未注册的连接写入 search_results 或读取该视图会报
+    "no such function"。所有连接池连接都已注册；其他工具（脚本、备份后的修复等）请用 `connect` 打开数据库，
+    sqlite3 命令行无法注册该函数，只能用于只读查询 search_results 等表
+    """
+    conn.create_function("decompress_text", 1, decompress_text, deterministic=True)
+
+def connect(db_path: str, **kwargs) -> sqlite3.Connection:
+    """打开缓存数据库的普通连接（供工具脚本使用），已注册 `register_functions` 中的 SQL 函数"""
+    conn = sqlite3.connect(db_path, **kwargs)
+    conn.row_factory = sqlite3.Row
+    register_functions(conn)
+    return conn
+
+
+class SQLiteConnectionPool:
+    """
+    Persistent, per-thread SQLite connections tuned for a read-heavy cache.
+
+    Every thread gets one long-lived connection (opened on first use) configured with
+    WAL journaling, ``synchronous=NORMAL``, a larger page cache and memory-mapped I/O,
+    so readers never block the writer and no request pays for ``sqlite3.connect``.
+    """
+    def __init__(
+            self,
+            db_path: str,
+            cache_size_kb: int=64 * 1024,
+            mmap_size: int=256 * 1024 * 1024,
+            busy_timeout_ms: int=5000
+        ):
+        self.db_path = db_path
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """创建并配置一个新连接"""
+        # check_same_thread=False 仅用于 close_all 在其他线程关闭连接，每个连接只被其所属线程使用
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=self.busy_timeout_ms / 1000)
+        conn.row_factory = sqlite3.Row  # 使查询结果支持字典访问
+        # auto_vacuum 只能在建表前设置：新数据库默认开启增量回收，旧数据库需通过 enable_incremental_vacuum 转换
+        if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        # 供全文索引的视图和触发器读取压缩字段
+        register_functions(conn)
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def connection(self) -> Generator[sqlite3.Connection, None, None]:
+        """获取当前线程的连接（上下文管理器）；未提交的事务在退出时回滚"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        try:
+            yield conn
+        finally:
+            # 与每次新建/关闭连接时的语义保持一致：未提交的修改不会泄漏到下一次使用
+            if conn.in_transaction:
+                conn.rollback()
+
+    def close_all(self) -> None:
+        """关闭该池创建的所有连接"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+
+def database_size(conn: sqlite3.Connection) -> int:
+    """数据库中实际使用的字节数（不含空闲页）"""
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return (page_count - freelist_count) * page_size
+
+def incremental_vacuum(conn: sqlite3.Connection, pages: int) -> int:
+    """归还至多 pages 个空闲页给文件系统，返回剩余空闲页数；未开启增量回收时不做任何事"""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        # execute() 只单步执行该 PRAGMA（每次只释放一页），executescript 会执行到结束
+        conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+    return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+def enable_incremental_vacuum(conn: sqlite3.Connection) -> bool:
+    """将已有数据库转换为增量回收模式（需要一次完整 VACUUM），已开启时返回 False"""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return False
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("VACUUM")
+    return True
+
+def get_pool(db_path: str) -> SQLiteConnectionPool:
+    """获取（必要时创建）db_path 对应的共享连接池"""
+    with _pools_lock:
+        if db_path not in _pools:
+            _pools[db_path] = SQLiteConnectionPool(db_path)
+        return _pools[db_path]
+
+def close_all_pools() -> None:
+    """关闭所有连接池（应用关闭时调用）"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
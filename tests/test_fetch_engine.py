@@ -0,0 +1,92 @@
+import asyncio
+from typing import List
+
+import httpx
+
+from extract_backends import create_extractor
+from fetch import failure_kind
+from fetch_engine import FetchEngine
+
+READER_URL = 'http://reader.test/'
+PAGE_HTML = '<html><head><title>Page</title></head><body><article><p>' + 'Direct page text. ' * 30 + '</p></article></body></html>'
+
+
+def make_engine(reader_handler, direct_status: int=200, reader_timeout: float=1.0):
+    """阅读服务与直接下载都由 httpx.MockTransport 桩响应的抓取引擎，返回（引擎，按顺序记录的请求）"""
+    requests: List[str] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        url = str(request.url)
+        if url.startswith(READER_URL):
+            requests.append('reader')
+            return await reader_handler(request)
+        requests.append('direct')
+        if direct_status != 200:
+            return httpx.Response(direct_status)
+        return httpx.Response(200, headers={'Content-Type': 'text/html; charset=utf-8'}, content=PAGE_HTML.encode())
+
+    backends = [
+        create_extractor('reader', endpoint=READER_URL, timeout=reader_timeout),
+        create_extractor('pdf'),
+        create_extractor('html'),
+    ]
+    for backend in backends:
+        backend._client = httpx.AsyncClient(transport=httpx.MockTransport(handler), follow_redirects=True)
+    return FetchEngine(backends, rate_per_second=None), requests
+
+def fetch(engine: FetchEngine, url: str):
+    async def run():
+        try:
+            return await engine.fetch(url)
+        finally:
+            await engine.aclose()
+    return asyncio.run(run())
+
+
+def test_reader_result_is_used_without_direct_download():
+    async def reader(request):
+        return httpx.Response(200, content=b'# Title\n\n' + b'Reader text. ' * 30)
+
+    engine, requests = make_engine(reader)
+    result = fetch(engine, 'http://site.test/page')
+    assert requests == ['reader']
+    assert result['text'].startswith('# Title')
+
+def test_reader_5xx_falls_back_to_direct_download():
+    async def reader(request):
+        return httpx.Response(503)
+
+    engine, requests = make_engine(reader)
+    result = fetch(engine, 'http://site.test/page')
+    assert requests == ['reader', 'direct']
+    assert failure_kind(result) is None
+    assert 'Direct page text.' in result['text']
+
+def test_empty_reader_response_falls_back_to_direct_download():
+    async def reader(request):
+        return httpx.Response(200, content=b'')
+
+    engine, requests = make_engine(reader)
+    result = fetch(engine, 'http://site.test/page')
+    assert requests == ['reader', 'direct']
+    assert 'Direct page text.' in result['text']
+
+def test_reader_timeout_falls_back_to_direct_download():
+    async def reader(request):
+        await asyncio.sleep(5)
+        return httpx.Response(200, content=b'too late')
+
+    engine, requests = make_engine(reader, reader_timeout=0.1)
+    result = fetch(engine, 'http://site.test/page')
+    assert requests == ['reader', 'direct']
+    assert 'Direct page text.' in result['text']
+
+def test_failed_direct_download_is_not_repeated_by_another_direct_backend():
+    async def reader(request):
+        return httpx.Response(502)
+
+    engine, requests = make_engine(reader, direct_status=404)
+    result = fetch(engine, 'http://site.test/paper.pdf')
+    # pdf 与 html 后端都直接下载同一地址：pdf 失败后不再由 html 重复下载
+    assert requests == ['reader', 'direct']
+    assert failure_kind(result) == 'http_4xx'
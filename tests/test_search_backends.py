@@ -0,0 +1,97 @@
+import time
+import asyncio
+from typing import Dict, Optional
+
+import pytest
+
+from search_backends import SearchBackend, HedgedBackend
+
+
+class StubBackend(SearchBackend):
+    """本地桩后端：等待 delay 秒后返回结果或抛出 error，记录开始时间与是否被取消"""
+    def __init__(self, name: str, delay: float, error: Optional[Exception]=None):
+        super().__init__()
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.started: Optional[float] = None
+        self.cancelled = False
+
+    async def search(self, query: str, num_results: int) -> Dict:
+        self.calls += 1
+        self.started = time.monotonic()
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+        return {'query': query, 'backend': self.name, 'items': []}
+
+
+async def _search(backend: HedgedBackend) -> Dict:
+    result = await backend.search('q', 10)
+    await asyncio.sleep(0.01)  # 让被取消的任务处理 CancelledError
+    return result
+
+
+def test_fast_primary_does_not_hedge():
+    primary, secondary = StubBackend('primary', 0.01), StubBackend('secondary', 0.01)
+    backend = HedgedBackend(primary, secondary, initial_delay=0.2)
+    assert asyncio.run(_search(backend))['backend'] == 'primary'
+    assert secondary.calls == 0
+    assert backend.hedged_count == 0
+    assert len(backend.latencies) == 1
+
+def test_slow_primary_is_hedged_after_delay_and_cancelled():
+    primary, secondary = StubBackend('primary', 5.0), StubBackend('secondary', 0.01)
+    backend = HedgedBackend(primary, secondary, initial_delay=0.1)
+
+    async def run():
+        start = time.monotonic()
+        result = await _search(backend)
+        return result, start, time.monotonic() - start
+
+    result, start, elapsed = asyncio.run(run())
+    assert result['backend'] == 'secondary'
+    assert secondary.started - start >= 0.1
+    assert elapsed < 1.0
+    assert primary.cancelled
+    assert backend.hedged_count == 1
+
+def test_slow_secondary_loses_and_is_cancelled():
+    primary, secondary = StubBackend('primary', 0.2), StubBackend('secondary', 5.0)
+    backend = HedgedBackend(primary, secondary, initial_delay=0.05)
+    assert asyncio.run(_search(backend))['backend'] == 'primary'
+    assert secondary.calls == 1
+    assert secondary.cancelled
+
+def test_failing_primary_hedges_without_waiting():
+    primary = StubBackend('primary', 0.0, error=RuntimeError('primary down'))
+    secondary = StubBackend('secondary', 0.01)
+    backend = HedgedBackend(primary, secondary, initial_delay=5.0)
+
+    async def run():
+        start = time.monotonic()
+        result = await _search(backend)
+        return result, time.monotonic() - start
+
+    result, elapsed = asyncio.run(run())
+    assert result['backend'] == 'secondary'
+    assert elapsed < 1.0
+
+def test_both_failing_raises_primary_error():
+    primary = StubBackend('primary', 0.0, error=RuntimeError('primary down'))
+    secondary = StubBackend('secondary', 0.0, error=ValueError('secondary down'))
+    backend = HedgedBackend(primary, secondary, initial_delay=0.05)
+    with pytest.raises(RuntimeError, match='primary down'):
+        asyncio.run(backend.search('q', 10))
+
+def test_hedge_delay_uses_latency_percentile():
+    backend = HedgedBackend(StubBackend('primary', 0), StubBackend('secondary', 0), percentile=0.9, min_samples=10, initial_delay=1.0)
+    backend.latencies.extend([0.1] * 5)
+    assert backend.hedge_delay() == 1.0
+    backend.latencies.extend([0.1 * i for i in range(1, 11)])
+    assert backend.hedge_delay() == pytest.approx(0.9)
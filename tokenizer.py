@@ -1,12 +1,25 @@
-from transformers import AutoTokenizer
+from functools import lru_cache
 
-tokenizer_mapping = {
-    "qwq-32b": AutoTokenizer.from_pretrained("/chenyaofo/hf_models/QwQ-32B", trust_remote_code=True),
+# Qwen2.5 系列（含 QwQ、deepseek-r1-distill-qwen）使用同一个分词器词表，共用本地的 QwQ-32B 分词器文件。
+# 未列出的模型（deepseek-v3、deepseek-r1、llama）没有本地分词器，token 数按 context_budget.estimate_tokens 估算
+QWEN_TOKENIZER_PATH = "/chenyaofo/hf_models/QwQ-32B"
+tokenizer_paths = {
+    "qwq-32b": QWEN_TOKENIZER_PATH,
+    "qwen2.5-72b-instruct": QWEN_TOKENIZER_PATH,
+    "qwen2.5-32b-instruct": QWEN_TOKENIZER_PATH,
+    "qwen2.5-7b-instruct": QWEN_TOKENIZER_PATH,
+    "qwen2.5-coder-32b-instruct": QWEN_TOKENIZER_PATH,
+    "deepseek-r1-distill-qwen-32b": QWEN_TOKENIZER_PATH,
 }
 
-def get_tokenizer(model_name: str) -> AutoTokenizer:
-    if model_name in tokenizer_mapping:
-        return tokenizer_mapping[model_name]
+@lru_cache(maxsize=None)
+def _load_tokenizer(path: str):
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(path, trust_remote_code=True)
+
+def get_tokenizer(model_name: str):
+    """模型的分词器；首次使用时才加载（导入本模块不加载 transformers 和分词器文件），同一路径只加载一次"""
+    if model_name in tokenizer_paths:
+        return _load_tokenizer(tokenizer_paths[model_name])
     else:
-        raise ValueError(f"Model name {model_name} not found in tokenizer_mapping")
-    
\ No newline at end of file
+        raise ValueError(f"Model name {model_name} not found in tokenizer_paths")
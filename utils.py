@@ -1,58 +1,76 @@
 import re
+import unicodedata
 from copy import deepcopy
-from typing import List, Dict
+from typing import List, Dict, Hashable, Optional
+from search_backends import is_normalized, normalize_search_results
 
 
 def extract_relevant_info(search_results: Dict) -> List[Dict]:
     """
-    Extract relevant information from Bing search results.
+    Extract relevant information from search results.
 
     Args:
-        search_results (dict): JSON response from the Bing Web Search API.
+        search_results (dict): A normalized search result (see `search_backends`), or a raw
+            Bocha/Tavily response cached before normalization was introduced.
 
     Returns:
         list: A list of dictionaries containing the extracted information.
     """
-    useful_info = []
+    normalized = normalize_search_results(search_results)
+    return [
+        {
+            'id': id + 1,  # Increment id for easier subsequent operations
+            'keywords': [normalized['query']],
+            **item,  # 'context' stays empty unless the backend returned page content
+        }
+        for id, item in enumerate(normalized['items'])
+    ]
+
+def local_hits_to_relevant_info(keyword: str, hits: List[Dict]) -> List[Dict]:
+    """
+    Convert local retrieval hits (rows of the crawler cache) into relevant info entries.
 
-    icon_base_url = 'https://t0.gstatic.com/faviconV2?client=SOCIAL&type=FAVICON&fallback_opts=TYPE,SIZE,URL&url={url}&size=64'
-    
-    if 'webPages' in search_results and 'value' in search_results['webPages']:  # bocha
-        for id, result in enumerate(search_results['webPages']['value']):
-            info = {
-                'id': id + 1,  # Increment id for easier subsequent operations
-                'keywords': [search_results.get('queryContext', {}).get('originalQuery', '')], # TODO 兼容bing等API嘛？
-                'title': result.get('name', ''),
-                'url': result.get('url', ''),
-                'site_name': result.get('siteName', ''),
-                'site_icon': result.get('siteIcon', ''),
-                'date': result.get('dateLastCrawled', '').split('T')[0],  # TODO 兼容bing等API嘛？
-                'snippet': result.get('snippet', ''),  # Remove HTML tags
-                # Add context content to the information
-                'context': ''  # Reserved field to be filled later
-            }
-            useful_info.append(info)
+    Args:
+        keyword (str): The search keyword the hits answer.
+        hits (list): Rows returned by `CrawlerDatabaseManager.search_local`.
+
+    Returns:
+        list: A list of dictionaries in the same format as `extract_relevant_info`.
+    """
+    return [
+        {
+            'id': id + 1,
+            'keywords': [keyword],
+            'title': hit.get('title') or '',
+            'url': hit['url'],
+            'site_name': hit.get('site_name') or '',
+            'site_icon': hit.get('site_icon') or '',
+            'date': hit.get('date') or '',
+            'snippet': hit.get('snippet') or '',
+            'context': hit.get('context') or '',
+        }
+        for id, hit in enumerate(hits)
+    ]
+
+def truncate_search_results(search_results: Dict, num_results: int) -> Dict:
+    """
+    Truncate a cached search response to its first `num_results` hits without mutating it.
+
+    Args:
+        search_results (dict): A search response as returned by the search API.
+        num_results (int): The number of hits to keep.
+
+    Returns:
+        dict: A (shallow) copy of the response holding at most `num_results` hits.
+    """
+    if is_normalized(search_results):
+        return {**search_results, 'items': search_results['items'][:num_results]}
+    elif 'webPages' in search_results and 'value' in search_results['webPages']:  # bocha
+        web_pages = {**search_results['webPages'], 'value': search_results['webPages']['value'][:num_results]}
+        return {**search_results, 'webPages': web_pages}
     elif 'results' in search_results:  # tavily
-        for id, result in enumerate(search_results['results']):
-            url = result.get('url', '')
-            site_icon = icon_base_url.format(url=url) if url else ''
-            info = {
-                'id': id + 1,  # Increment id for easier subsequent operations
-                'keywords': [search_results['query']], # TODO 兼容bing等API嘛？
-                'title': result.get('title', ''),
-                'url': url,
-                'site_name': result.get('siteName', ''),
-                'site_icon': site_icon,
-                'date': result.get('date', ''),
-                'snippet': result.get('content', ''),  # Remove HTML tags
-                # Add context content to the information
-                'context': result.get('raw_content', '')
-            }
-            useful_info.append(info)
-
-        print('useful_info:', useful_info)
-    
-    return useful_info
+        return {**search_results, 'results': search_results['results'][:num_results]}
+    return search_results
 
 def deduplicate_relevant_info_list(relevant_info_list: List[List[Dict]]) -> List[Dict]:
     """
@@ -77,6 +95,26 @@ def deduplicate_relevant_info_list(relevant_info_list: List[List[Dict]]) -> List
                 deduplicated_dict[url]['keywords'] = list(set(deduplicated_dict[url]['keywords']))
     return rerank_info_id(list(deduplicated_dict.values()))
 
+def merge_duplicate_info(relevant_info: List[Dict], keys: List[Optional[Hashable]]) -> List[Dict]:
+    """
+    Keep the first entry per duplicate key, merging the keywords of later duplicates into it.
+
+    Args:
+        relevant_info (list): A list of dictionaries containing relevant information.
+        keys (list): One duplicate key per entry; entries with a None key are always kept.
+
+    Returns:
+        list: The deduplicated list with re-ranked IDs.
+    """
+    kept = {}
+    for index, (info, key) in enumerate(zip(relevant_info, keys)):
+        key = ('unique', index) if key is None else key
+        if key not in kept:
+            kept[key] = info
+        else:
+            kept[key]['keywords'] = list(dict.fromkeys(kept[key]['keywords'] + info['keywords']))
+    return rerank_info_id(list(kept.values()))
+
 def rerank_info_id(relevant_info: List[Dict]) -> List[Dict]:
     """
     Re-rank the ID field in the relevant information list.
@@ -137,6 +175,17 @@ def extract_keywords(model_output: str) -> List[str]:
     keywords = [keyword for keyword in keywords if keyword]
     return keywords
 
+def normalize_query(query: str) -> str:
+    """
+    规范化搜索查询，用于缓存键：全角转半角、统一大小写、去除标点、合并空白，
+    并去掉与中文字符相邻的空白（"特斯拉 续航" 与 "特斯拉续航 " 视为同一查询）
+    """
+    query = unicodedata.normalize('NFKC', query).casefold()
+    query = ''.join(' ' if unicodedata.category(ch).startswith('P') else ch for ch in query)
+    query = re.sub(r'\s+', ' ', query).strip()
+    query = re.sub(r'(?<=[\u4e00-\u9fff]) | (?=[\u4e00-\u9fff])', '', query)
+    return query
+
 def detect_language_ratio(text: str) -> float:
     """Detect Chinese character ratio in text"""
     chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
@@ -1,26 +1,42 @@
-import uvicorn
+import os
+import sys
+import json
+import asyncio
+from contextlib import aclosing
 from fastapi import FastAPI, HTTPException, status
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 
 from templates.search import KEYWORD_EXTRACT_HH_MK_TEMPLATE_ZH, KEYWORD_EXTRACT_NH_MK_TEMPLATE_ZH, SKIP_SEARCH_MAKER
 from templates.analysis import ANALYSIS_NH_TEMPLATE_EN
-from const import EXTRACT_ERROR_MAKER, MODEL_INFOS, GPT_MODEL_NAME, SEARCH_API_URL, GPT_MODEL_API
+from const import EXTRACT_ERROR_MAKER, MODEL_INFOS, GPT_MODEL_NAME, SEARCH_API_URL, GPT_MODEL_API, \
+                  SEARCH_BACKEND, SEARCH_HEDGE_BACKEND, SEARCH_HEDGE_API_URL, SEARCH_HEDGE_PERCENTILE, JINA_READER_URL
 from private_key import GPT_MODEL_KEY, SEARCH_API_KEY, JINA_API_KEY
 from crawler_database_manager import CrawlerDatabaseManager
 from search_database_manager import SearchDatabaseManager
-from search import process_search_queries
-from fetch import fetch_page_content, extract_snippet_with_context
+from sqlite_pool import close_all_pools
+from cache_maintenance import CacheMaintainer
+from search import async_process_search_queries
+from search_backends import create_backend, HedgedBackend, close_async_client
+from fetch import failure_kind
+from context_budget import extract_budgeted_context, pack_documents, token_counter
+from fetch_engine import FetchEngine
+from extract_backends import create_extractor
+from parse_pool import ParsePool
 from LLM import llm_response_stream, llm_response, llm_response_iter_stream
 from utils import extract_relevant_info, \
+                  local_hits_to_relevant_info, \
+                  merge_duplicate_info, \
                   deduplicate_relevant_info_list, \
                   rerank_info_id, \
                   history_to_str, \
                   remove_id, \
+                  set_context_empty, \
                   extract_keywords, \
                   detect_language_ratio, \
                   extract_analysis_step
+from fingerprint import simhash, canonicalize_url, find_near_duplicate
 from diagram import gen_linear_diagram
 from templates.interactive_think import FEEDBACK_MIND_CONTENT, TRUNCATE_SEQS
 
@@ -31,9 +47,72 @@ USE_JINA_API = False
 max_keyword_num = 4
 search_num = 10
 top_k = 2
-max_doc_len = 3000
-cache_db_manager = CrawlerDatabaseManager('crawler_data.db')
-search_cache_db_manager = SearchDatabaseManager('search_data.db', outdated_days=10)
+# 过量抓取：每个关键词抓取 top_k + overfetch_extra 个候选页面，保留最先成功的 top_k 个
+overfetch_extra = 2
+# /search 的时间预算（秒），到期后只返回已就绪的页面
+SEARCH_DEADLINE_SECONDS = 10
+max_doc_len = 3000  # 片段提取时锚句两侧保留的字符数
+# token 预算（按模型分词器计数，见 context_budget；未配置分词器的模型按字符数估算，见 tokenizer.tokenizer_paths）：
+# /search 中每个页面正文的上限（按 GPT_MODEL_NAME 的分词器计数，解析进程启动时加载），以及对话中全部参考资料的上限
+SEARCH_DOC_TOKENS = 1500
+CHAT_CONTEXT_TOKENS = 8000
+# 本地检索：关键词在已抓取页面中有至少 top_k 个强匹配时，直接使用本地结果，不调用搜索 API 和抓取
+USE_LOCAL_RETRIEVAL = True
+local_min_coverage = 0.6
+# 缓存页面超过该时长后，用条件请求（ETag/Last-Modified）在后台刷新，本次请求直接使用缓存内容；未变化（304）时不重新下载和解析
+REVALIDATE_AFTER_HOURS = 24
+cache_db_manager = CrawlerDatabaseManager('crawler_data.db', memory_cache_bytes=256 * 1024 * 1024)
+search_cache_db_manager = SearchDatabaseManager('search_data.db', outdated_days=10, stale_days=20, memory_cache_bytes=64 * 1024 * 1024)
+cache_maintainer = CacheMaintainer(
+    cache_db_manager, search_cache_db_manager,
+    crawler_max_age_days=90,
+    crawler_max_bytes=4 * 1024 * 1024 * 1024,
+    search_max_bytes=512 * 1024 * 1024,
+)
+# HTML/PDF 解析与片段匹配在进程池中执行，不受 GIL 限制（0 表示在线程中执行）；工作进程启动时加载 GPT_MODEL_NAME 的分词器
+PARSE_WORKERS = 4
+parse_pool = ParsePool(
+    workers=PARSE_WORKERS, preload=('fetch_engine', 'context_budget', 'fingerprint'),
+    initializer=token_counter, initargs=(GPT_MODEL_NAME,)
+)
+# 正文提取后端按顺序尝试：失败、超时或提取不到正文时换下一个（见 extract_backends.EXTRACT_BACKENDS）
+EXTRACT_BACKEND_CHAIN = ['reader', 'pdf', 'html'] if USE_JINA_API else ['pdf', 'html']
+READER_API_URL = JINA_READER_URL
+extract_backends = [
+    create_extractor(name, api_key=JINA_API_KEY, endpoint=READER_API_URL) if name == 'reader' else create_extractor(name)
+    for name in EXTRACT_BACKEND_CHAIN
+]
+# 页面抓取：全局与单主机并发上限、令牌桶限速，连接池在请求间复用
+fetch_engine = FetchEngine(extract_backends, max_concurrency=32, per_host_concurrency=4, rate_per_second=20, parse_pool=parse_pool)
+search_backend = create_backend(SEARCH_BACKEND, api_key=SEARCH_API_KEY, endpoint=SEARCH_API_URL)
+if SEARCH_HEDGE_BACKEND:
+    from private_key import SEARCH_HEDGE_API_KEY
+    search_backend = HedgedBackend(
+        search_backend,
+        create_backend(SEARCH_HEDGE_BACKEND, api_key=SEARCH_HEDGE_API_KEY, endpoint=SEARCH_HEDGE_API_URL),
+        percentile=SEARCH_HEDGE_PERCENTILE,
+    )
+
+# 后台刷新过期缓存页面的任务（保留引用，避免任务被回收），以及正在刷新的 URL（同一页面不重复刷新）
+background_tasks = set()
+revalidating_urls = set()
+
+@app.on_event("startup")
+async def startup():
+    cache_maintainer.start()
+    await parse_pool.warm_up()
+    # 分词器在首次使用时加载（导入 transformers、读取分词器文件），启动时预先加载，不阻塞首个请求
+    await asyncio.to_thread(token_counter, GPT_MODEL_NAME)
+
+@app.on_event("shutdown")
+async def shutdown():
+    cache_maintainer.stop(timeout=5)
+    for task in background_tasks:
+        task.cancel()
+    await close_async_client()
+    await fetch_engine.aclose()
+    parse_pool.shutdown()
+    close_all_pools()
 
 class QuestionRequest(BaseModel):
     question: str
@@ -41,6 +120,7 @@ class QuestionRequest(BaseModel):
 
 class SearchRequest(BaseModel):
     keywords: List[str]
+    deadline_seconds: Optional[float] = None  # 覆盖 SEARCH_DEADLINE_SECONDS
 
 class OpenaiRequest(BaseModel):
     model: str
@@ -48,6 +128,7 @@ class OpenaiRequest(BaseModel):
     temperature: float = 0.0
     stream: bool = True
     search_context_url: List[str] = []
+    context_tokens: Optional[int] = None  # 覆盖 CHAT_CONTEXT_TOKENS
 
 class InteractiveRequest(BaseModel):
     model: str
@@ -107,67 +188,345 @@ async def get_keywords(request: QuestionRequest):
         print(search_queries)
         return {"keywords": search_queries}
 
-@app.post("/search")
-async def search(request: SearchRequest):
+async def revalidate_cached(cached_rows: Dict[str, Dict], snippets: Dict[str, str]) -> None:
+    """
+    后台用条件请求（ETag/Last-Modified）刷新过期的缓存页面：未变化（304）时只更新抓取时间与验证器，
+    内容变化时重新提取片段并写入缓存；刷新失败时保留原缓存
+    """
+    urls = list(cached_rows)
+    not_modified, updated = [], []
+    try:
+        async with aclosing(fetch_engine.fetch_iter(urls, validators=cached_rows)) as fetched:
+            async for url, result in fetched:
+                if result['not_modified']:
+                    not_modified.append(dict(result, url=url))
+                    continue
+                if failure_kind(result) is not None:
+                    continue
+                try:
+                    (_, context), fingerprint = await asyncio.gather(
+                        parse_pool.run(
+                            extract_budgeted_context, result['text'], snippets[url], max_doc_len, SEARCH_DOC_TOKENS, GPT_MODEL_NAME
+                        ),
+                        parse_pool.run(simhash, result['text']),
+                    )
+                except Exception as e:
+                    print(f"Error extracting snippet from {url}: {e}")
+                    continue
+                updated.append({
+                    'url': url, 'context': context, 'fingerprint': fingerprint,
+                    **{k: result[k] for k in ('etag', 'last_modified', 'fetched_time')}
+                })
+    finally:
+        revalidating_urls.difference_update(urls)
+    await asyncio.to_thread(cache_db_manager.mark_revalidated, not_modified)
+    await asyncio.to_thread(cache_db_manager.batch_upsert, updated)
+    print(f"Revalidated {len(urls)} cached URLs: {len(not_modified)} not modified, {len(updated)} updated.")
+
+def schedule_revalidation(cached_rows: Dict[str, Dict], snippets: Dict[str, str]) -> None:
+    """在后台任务中刷新过期的缓存页面（见 `revalidate_cached`），已在刷新中的页面跳过"""
+    urls = [url for url in cached_rows if url not in revalidating_urls]
+    if not urls:
+        return
+    revalidating_urls.update(urls)
+    task = asyncio.ensure_future(revalidate_cached({u: cached_rows[u] for u in urls}, {u: snippets[u] for u in urls}))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+def format_sse_event(event: str, data: Dict) -> str:
+    """格式化为 SSE 事件"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def search_events(request: SearchRequest, stream: bool=False) -> AsyncIterator[Tuple[str, Dict]]:
+    """
+    The /search pipeline, producing (event, data) pairs as results become available:
+
+    - ``hits``: ``{"search_results": [...]}``, the candidate pages with their search snippets
+      (no context yet), as soon as the search responses are in.
+    - ``document`` (only if stream): one selected page with its extracted context, as soon as
+      it is ready; pages arrive in completion order and keep the ``id`` given in ``hits``.
+    - ``done``: ``{"search_results": [...]}``, the selected pages in rank order.
+
+    Fetching stops once every keyword's top_k best-ranked usable pages are known. Without
+    stream, pages are processed in rank order once all are ready: a near-duplicate of a
+    better-ranked page is merged into it and every keyword keeps its top_k best-ranked pages.
+    With stream, the same happens in completion order so
+    that pages can be sent early; the selection may then differ from the non-streaming one.
+    """
     search_queries = request.keywords
     if not search_queries:
-        return {"search_results": []}
+        yield 'done', {"search_results": []}
+        return
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + (request.deadline_seconds or SEARCH_DEADLINE_SECONDS)
+
+    local_info = {}
+    if USE_LOCAL_RETRIEVAL:
+        local_hits = await asyncio.gather(*(
+            asyncio.to_thread(cache_db_manager.search_local, keyword, limit=top_k * 3, min_coverage=local_min_coverage)
+            for keyword in search_queries
+        ))
+        for keyword, hits in zip(search_queries, local_hits):
+            if len(hits) >= top_k:
+                local_info[keyword] = local_hits_to_relevant_info(keyword, hits[:top_k])
+        print(f"Answered locally: {list(local_info)}")
 
-    query_to_search_results = process_search_queries(
-        search_queries, SEARCH_API_KEY, SEARCH_API_URL, 
+    remote_queries = [q for q in search_queries if q not in local_info]
+    query_to_search_results = await async_process_search_queries(
+        remote_queries, search_backend,
         num_results_per_query=search_num,
         search_db_manager=search_cache_db_manager
-    )
+    ) if remote_queries else {}
     relevant_info = deduplicate_relevant_info_list(
         [
-            extract_relevant_info(results)[:top_k]
+            extract_relevant_info(results)[:top_k + overfetch_extra]
             for results in query_to_search_results.values()
-        ]
+        ] + list(local_info.values())
+    )
+    # http/https、www 等 URL 变体，以及缓存中已标记为近似重复的页面只保留一份
+    canonical_urls = await asyncio.to_thread(cache_db_manager.resolve_duplicates, [it['url'] for it in relevant_info])
+    relevant_info = merge_duplicate_info(
+        relevant_info, [canonicalize_url(canonical_urls.get(it['url'], it['url'])) for it in relevant_info]
     )
     urls_to_fetch = [it['url'] for it in relevant_info if not it['context']]  # not include the context
-    urls_to_fetch_filtered = [u for u in urls_to_fetch if cache_db_manager.get(u) is None]  # not include the cache
-    cached_urls = [u for u in urls_to_fetch if u not in urls_to_fetch_filtered]
+    source_urls = {u: canonical_urls.get(u, u) for u in urls_to_fetch}  # 重复页面直接读取其规范页面的缓存
+    cached_rows = await asyncio.to_thread(cache_db_manager.get_many, list(source_urls.values()))
+    urls_to_fetch_filtered = [u for u in urls_to_fetch if source_urls[u] not in cached_rows]  # not include the cache
+    # 负缓存：近期抓取失败（超时、死链、空页面等）的 URL 在退避期内不再抓取
+    failure_states = await asyncio.to_thread(cache_db_manager.failure_states, urls_to_fetch_filtered)
+    blocked_urls = {u for u, blocked in failure_states.items() if blocked}
+    if blocked_urls:
+        print(f"Skipped {len(blocked_urls)} URLs that failed recently.")
+        urls_to_fetch_filtered = [u for u in urls_to_fetch_filtered if u not in blocked_urls]
+    urls_to_revalidate = [
+        u for u in urls_to_fetch
+        if source_urls[u] == u and u in cached_rows
+        and cache_db_manager.needs_revalidation(cached_rows[u], REVALIDATE_AFTER_HOURS * 3600)
+    ]
+
+    # 页面是否可用：True 已有内容（本地结果、缓存）或抓取成功，False 不可用或不抓取，None 等待抓取结果
+    keywords_of = {info['url']: info['keywords'] for info in relevant_info}
+    candidates_of = {}  # 关键词 -> 按排名排列的候选 URL
+    for info in relevant_info:
+        for keyword in info['keywords']:
+            candidates_of.setdefault(keyword, []).append(info['url'])
+    usable = {
+        info['url']: True if info['context'] or source_urls.get(info['url']) in cached_rows else None
+        for info in relevant_info
+    }
+
+    def ranked_usable_before(keyword: str, url: str) -> int:
+        """关键词的候选中排在 url 之前的可用页面数"""
+        candidates = candidates_of[keyword]
+        return sum(usable[u] is True for u in candidates[:candidates.index(url)])
+
+    def settled(keyword: str) -> bool:
+        """关键词排名最前的 top_k 个可用页面是否已经确定（排在它们之前的候选都已有抓取结果）"""
+        found = 0
+        for url in candidates_of[keyword]:
+            if found >= top_k or usable[url] is None:
+                break
+            found += usable[url]
+        return found >= top_k or all(usable[u] is not None for u in candidates_of[keyword])
+
+    # 只抓取排在某个关键词前 top_k 个可用页面之前的候选
+    urls_to_fetch_filtered = [
+        u for u in urls_to_fetch_filtered if any(ranked_usable_before(k, u) < top_k for k in keywords_of[u])
+    ]
+    for url in set(usable) - set(urls_to_fetch_filtered):
+        if usable[url] is None:
+            usable[url] = False
+
+    info_by_url = {info['url']: info for info in relevant_info}
+    for doc_info in relevant_info:
+        doc_info['snippet'] = doc_info['snippet'].replace('<b>','').replace('</b>','')
+    yield 'hits', {"search_results": set_context_empty(relevant_info)}
+
+    validators = {}
+    def raw_context_of(doc_info: Dict, result: Optional[Dict]=None) -> str:
+        """页面原始正文：抓取结果，未抓取时使用缓存内容"""
+        url = doc_info['url']
+        if result is not None:
+            if result.get('fetched_time'):
+                validators[url] = {k: result[k] for k in ('etag', 'last_modified', 'fetched_time')}
+            return result['text']
+        cached = cached_rows.get(source_urls.get(url))
+        if cached:
+            return cached['context'] or ""
+        return doc_info['context']
+
+    # 每个页面的原始正文就绪后立即在解析进程池中提取片段，完成后放入 ready 队列；抓取结束时放入 None
+    ready: asyncio.Queue = asyncio.Queue()
+    started, tasks = set(), set()
 
-    if urls_to_fetch_filtered:
+    async def extract(doc_info: Dict, raw_context: str) -> None:
+        # 片段提取与内容指纹（用于合并近似重复页面）都在解析进程池中计算
+        jobs = [parse_pool.run(
+            extract_budgeted_context, raw_context, doc_info['snippet'], max_doc_len, SEARCH_DOC_TOKENS, GPT_MODEL_NAME
+        )]
+        if not raw_context.startswith(EXTRACT_ERROR_MAKER):
+            jobs.append(parse_pool.run(simhash, raw_context))
+        fingerprint = None
         try:
-            fetched_contents = fetch_page_content(
-                urls_to_fetch_filtered,
-                use_jina=USE_JINA_API,
-                jina_api_key=JINA_API_KEY,
-            )
-            print(f"Fetched {len(fetched_contents)} URLs successfully.")
+            (_, filtered_context), *fingerprints = await asyncio.gather(*jobs)
+            fingerprint = fingerprints[0] if fingerprints else None
         except Exception as e:
-            print(f"Error during batch URL fetching: {e}")
-            fetched_contents = {url: f"Error fetching URL: {e}" for url in urls_to_fetch_filtered}
+            print(f"Error extracting snippet from {doc_info['url']}: {e}")
+            filtered_context = raw_context[:max_doc_len*2]
+        ready.put_nowait((doc_info, fingerprint, filtered_context))
 
-    for i, doc_info in enumerate(relevant_info):
-        url = doc_info['url']
-        if url in cached_urls:
-            raw_context = cache_db_manager.get(url)['context']
-        elif url in urls_to_fetch_filtered:
-            raw_context = fetched_contents.get(url, "")
-        else:
-            raw_context = doc_info['context']
-        doc_info['snippet'] = doc_info['snippet'].replace('<b>','').replace('</b>','')
-        success, filtered_context = extract_snippet_with_context(raw_context, doc_info['snippet'], context_chars=max_doc_len)
-        if success:
-            context = filtered_context
-        else:
-            context = raw_context[:max_doc_len*2]
+    def start_extract(doc_info: Dict, raw_context: str) -> None:
+        started.add(doc_info['url'])
+        tasks.add(asyncio.ensure_future(extract(doc_info, raw_context)))
+
+    async def fetch_documents() -> None:
+        try:
+            fetch_results = {}
+            if urls_to_fetch_filtered:
+                try:
+                    # 按完成顺序接收结果：各关键词排名最前的 top_k 个可用页面都已确定或到达截止时间后，取消仍在进行的抓取
+                    all_settled = False
+                    async with aclosing(fetch_engine.fetch_iter(
+                        urls_to_fetch_filtered, timeout=max(0.0, deadline - loop.time())
+                    )) as fetched:
+                        async for url, result in fetched:
+                            fetch_results[url] = result
+                            start_extract(info_by_url[url], raw_context_of(info_by_url[url], result))
+                            usable[url] = failure_kind(result) is None
+                            if all(map(settled, candidates_of)):
+                                all_settled = True
+                                break
+                    if len(fetch_results) == len(urls_to_fetch_filtered):
+                        print(f"Fetched all {len(fetch_results)} URLs.")
+                    elif all_settled:
+                        print(f"Fetched {len(fetch_results)} of {len(urls_to_fetch_filtered)} URLs, "
+                              f"stopped once every keyword had its top {top_k} pages.")
+                    else:
+                        print(f"Fetched {len(fetch_results)} of {len(urls_to_fetch_filtered)} URLs before the deadline.")
+                    failures = {url: failure_kind(fetch_results[url]) for url in urls_to_fetch_filtered if url in fetch_results}
+                    await asyncio.to_thread(cache_db_manager.record_failures, [
+                        {'url': url, 'kind': kind, 'error': fetch_results[url]['text']}
+                        for url, kind in failures.items() if kind
+                    ])
+                    # 只清除此前有失败记录（退避期已过、本次重新抓取成功）的 URL，避免每次请求都执行无效的删除
+                    await asyncio.to_thread(cache_db_manager.clear_failures, [
+                        url for url, kind in failures.items() if not kind and url in failure_states
+                    ])
+                except Exception as e:
+                    print(f"Error during batch URL fetching: {e}")
+            # 截止时间前未抓取完成的页面：有缓存时使用缓存内容
+            for doc_info in relevant_info:
+                if doc_info['url'] not in started:
+                    start_extract(doc_info, raw_context_of(doc_info))
+        finally:
+            ready.put_nowait(None)
 
+    # 无需抓取的页面（本地结果、缓存，包括待刷新的过期缓存）立即开始提取
+    fetching_urls = set(urls_to_fetch_filtered)
+    for doc_info in relevant_info:
+        if doc_info['url'] not in fetching_urls:
+            start_extract(doc_info, raw_context_of(doc_info))
+    fetch_task = asyncio.ensure_future(fetch_documents())
+
+    kept, selected, seen_fingerprints, counts = [], [], [], {}
+    fingerprint_of = {}  # 已计算的内容指纹随记录写入缓存，无需重新计算
+
+    def accept(doc_info: Dict, fingerprint: Optional[int], context: str) -> bool:
+        """
+        处理一个提取完成的页面，返回是否选中：近似重复（镜像、转载）的页面合并到先处理的那一份；
+        过量抓取的候选也写入缓存，但每个关键词只选中 top_k 个
+        """
+        if context.strip() == "" or context.startswith(EXTRACT_ERROR_MAKER):
+            return False
+        duplicate_of = find_near_duplicate(fingerprint, seen_fingerprints)
+        if duplicate_of is not None:
+            original = kept[duplicate_of]
+            new_keywords = [k for k in doc_info['keywords'] if k not in original['keywords']]
+            original['keywords'] = original['keywords'] + new_keywords
+            if original in selected:
+                for keyword in new_keywords:
+                    counts[keyword] = counts.get(keyword, 0) + 1
+            return False
+        if fingerprint is not None:
+            seen_fingerprints.append((fingerprint, len(kept)))
+        fingerprint_of[doc_info['url']] = fingerprint
         doc_info['context'] = context
-    
-    # post-process the relevant info
+        kept.append(doc_info)
+        if any(counts.get(keyword, 0) < top_k for keyword in doc_info['keywords']):
+            selected.append(doc_info)
+            for keyword in doc_info['keywords']:
+                counts[keyword] = counts.get(keyword, 0) + 1
+            return True
+        return False
+
+    finished_items = []
+    try:
+        finished, fetching = 0, True
+        while fetching or finished < len(started):
+            item = await ready.get()
+            if item is None:
+                fetching = False
+                continue
+            finished += 1
+            if not stream:
+                finished_items.append(item)
+            elif accept(*item):
+                yield 'document', item[0]
+    finally:
+        fetch_task.cancel()
+        for task in tasks:
+            task.cancel()
+    # 非流式：全部页面就绪后按排名处理，结果不受完成顺序影响
+    for item in sorted(finished_items, key=lambda item: item[0]['id']):
+        accept(*item)
+
     print(f'before post-process num is {len(relevant_info)}')
-    relevant_info = [
-        info for info in relevant_info 
-        if info['context'].strip() != "" and 
-            not info['context'].startswith(EXTRACT_ERROR_MAKER)
-    ]
     #TODO 
-    cache_db_manager.batch_upsert(remove_id(relevant_info))
-    print(f'after post-process num is {len(relevant_info)}')
-    return {"search_results": rerank_info_id(relevant_info)}
+    await asyncio.to_thread(cache_db_manager.batch_upsert, [
+        {**info, **validators.get(info['url'], {}), 'fingerprint': fingerprint_of[info['url']]} for info in remove_id(kept)
+    ])
+    print(f'after post-process num is {len(selected)}')
+    # 过期的缓存页面本次直接使用缓存内容，写入本次结果之后再在后台刷新，刷新结果不会被上面的写入覆盖
+    schedule_revalidation(
+        {u: cached_rows[u] for u in urls_to_revalidate}, {u: info_by_url[u]['snippet'] for u in urls_to_revalidate}
+    )
+    yield 'done', {"search_results": sorted(selected, key=lambda info: info['id'])}
+
+@app.post("/search")
+async def search(request: SearchRequest):
+    search_results = []
+    async with aclosing(search_events(request)) as events:
+        async for event, data in events:
+            if event == 'done':
+                search_results = data['search_results']
+    return {"search_results": rerank_info_id(search_results)}
+
+@app.post("/search/stream", response_class=StreamingResponse)
+async def search_stream(request: SearchRequest):
+    """
+    SSE variant of /search: a ``hits`` event with the search results, one ``document`` event
+    per page as soon as its context is extracted, then ``done`` listing the selected page ids
+    (contexts omitted, they were already sent); see `search_events`.
+    """
+    async def event_stream():
+        try:
+            async with aclosing(search_events(request, stream=True)) as events:
+                async for event, data in events:
+                    if event == 'done':
+                        data = {"search_results": set_context_empty(data['search_results'])}
+                    yield format_sse_event(event, data)
+        except Exception as e:
+            print(f"Error during streaming search: {e}")
+            yield format_sse_event('error', {"detail": str(e)})
+
+    return StreamingResponse(
+        content=event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive"
+        }
+    )
 
 @app.post("/v1/chat/completions", response_class=StreamingResponse)
 async def chat(request: OpenaiRequest):
@@ -175,8 +534,9 @@ async def chat(request: OpenaiRequest):
     print(request.search_context_url)
 
     search_context = []
+    cached_rows = await asyncio.to_thread(cache_db_manager.get_many, request.search_context_url)
     for url in request.search_context_url:
-        item = cache_db_manager.get(url)
+        item = cached_rows.get(url)
         if item:
             search_context.append(item)
         else:
@@ -185,12 +545,24 @@ async def chat(request: OpenaiRequest):
                 detail=f"URL {url} not found in cache"
             )
 
+    # 参考资料按 token 预算装配：总量超出时按与问题的相关度分配预算，每篇只保留最相关的段落
+    document_headers = [
+        f"**文档 {i + 1}:**\n**标题：** {info.get('title', '')}\n**URL：** {info.get('url', 'None')}\n**内容：** "
+        for i, info in enumerate(search_context)
+    ]
+    def pack_context() -> List[str]:
+        # 在工作线程中执行：模型的分词器首次使用时才加载，不能阻塞事件循环
+        count_tokens = token_counter(request.model)
+        budget = (request.context_tokens or CHAT_CONTEXT_TOKENS) - sum(map(count_tokens, document_headers))
+        return pack_documents(
+            [info.get('context') or '<|Invalid Content|>' for info in search_context],
+            request.messages[-1]['content'] if request.messages else '',
+            budget, count_tokens
+        )
+    contexts = await asyncio.to_thread(pack_context)
     formatted_documents = ""
-    for i, info in enumerate(search_context):
-        formatted_documents += f"**文档 {i + 1}:**\n"
-        formatted_documents += f"**标题：** {info.get('title', '')}\n"
-        formatted_documents += f"**URL：** {info.get('url', 'None')}\n"
-        formatted_documents += f"**内容：** {info.get('context', '<|Invalid Content|>')}\n\n"
+    for header, context in zip(document_headers, contexts):
+        formatted_documents += f"{header}{context}\n\n"
 
     if formatted_documents:
         messages = request.messages
@@ -225,6 +597,13 @@ async def chat(request: OpenaiRequest):
 async def get_models():
     return {"models": MODEL_INFOS}
 
+@app.get("/cache/stats")
+async def get_cache_stats():
+    return {
+        "crawler": cache_db_manager.cache_stats(),
+        "search": search_cache_db_manager.cache_stats(),
+    }
+
 @app.post("/v2/chat/completions", response_class=StreamingResponse)
 async def iter_chat(request: InteractiveRequest):
     messages: List[Dict] = request.messages
@@ -262,4 +641,7 @@ async def iter_chat(request: InteractiveRequest):
 
 if __name__ == "__main__":
     # uvicorn.run('web_search:app', host="0.0.0.0", port=8000, reload=True)
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # 不以本模块为 __main__ 运行服务：解析进程池（forkserver/spawn）的每个工作进程都会以 __mp_main__ 重新导入主模块，
+    # 重复执行上面的数据库初始化与迁移、缓存维护、进程池和后端的构造。改由 uvicorn 命令行按模块名导入 app，
+    # 工作进程只会重新导入 uvicorn 的入口模块（等同于 python -m uvicorn web_search:app --host 0.0.0.0 --port 8000）
+    os.execv(sys.executable, [sys.executable, '-m', 'uvicorn', 'web_search:app', '--host', '0.0.0.0', '--port', '8000'])
\ No newline at end of file